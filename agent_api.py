@@ -1,17 +1,41 @@
 """Simple FastAPI backend to run the research agent via HTTP."""
+import asyncio
+import logging
+import os
+import threading
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from agent_core import run_agent, stream_agent
+from typing import Optional
+from agent_core import run_agent, refresh_agent
+from agent_events import SendQueue, encode_event, iter_run_events, make_event, new_run_id
+
+logger = logging.getLogger(__name__)
+
+# Bound on buffered outgoing events per connection and heartbeat period (seconds)
+SEND_QUEUE_SIZE = int(os.getenv("AGENT_SEND_QUEUE_SIZE", "64"))
+HEARTBEAT_INTERVAL = float(os.getenv("AGENT_HEARTBEAT_INTERVAL", "15"))
 
 app = FastAPI(title="Deep Research Agent API")
 
 
 class RunRequest(BaseModel):
     topic: str
+    # reuse evidence from a saved run of a similar topic, re-querying stale goals
+    refresh: bool = False
+    max_age_hours: Optional[float] = None
 
 
 @app.post("/run")
 def run(req: RunRequest):
+    if req.refresh:
+        final = refresh_agent(req.topic, max_age_hours=req.max_age_hours)
+        return {
+            "messages": [getattr(m, 'content', str(m)) for m in final.get("messages", [])],
+            "reused_goals": final["reused_goals"],
+            "refreshed_goals": final["refreshed_goals"],
+        }
     inputs = {"messages": [ {"content": req.topic, "type": "human"} ]}
     # agent_core expects actual message objects; construct simple wrapper for compatibility
     from langchain_core.messages import HumanMessage
@@ -27,48 +51,132 @@ def run(req: RunRequest):
     return out
 
 
+def _encode(event):
+    """Encode an event, replacing unserializable payloads with an error event."""
+    try:
+        return encode_event(event)
+    except (TypeError, ValueError) as exc:
+        logger.exception("failed to serialize %s event", event.get("type"))
+        return encode_event(make_event(
+            "error", event.get("run"), event.get("seq"),
+            message=f"unserializable {event.get('type')} event: {exc}",
+        ))
+
+
+def _start_run(queue, topic, run_id, cancelled, on_done=None):
+    """Run the agent on a daemon thread, pushing protocol events into `queue`."""
+
+    def worker():
+        try:
+            for event in iter_run_events(topic, run_id, cancelled=cancelled):
+                if queue.closed or cancelled.is_set():
+                    break
+                queue.put(event)
+        finally:
+            if on_done:
+                on_done()
+
+    t = threading.Thread(target=worker, daemon=True)
+    t.start()
+    return t
+
+
 @app.websocket("/ws/run")
 async def websocket_run(websocket: WebSocket):
-    """Accepts a JSON message {"topic": "..."} then streams intermediate outputs.
+    """Stream agent runs over a WebSocket using the `agent_events` protocol.
 
-    The generator in `stream_agent` is synchronous; run it in a background thread
-    and use `asyncio.run_coroutine_threadsafe` to send JSON messages over the WebSocket.
+    Client messages:
+    - {"type": "run", "topic": "...", "run": optional id} starts a run; several
+      runs may be active on one connection and are told apart by "run".
+    - {"type": "cancel", "run": "<id>"} stops a run after its current node.
+    - A bare {"topic": "..."} is accepted as a run request.
+
+    All runs share one bounded `SendQueue`, drained by a single sender task, so
+    a slow client throttles the agent threads instead of buffering frames.
+    Heartbeats are sent every `HEARTBEAT_INTERVAL` seconds.
     """
     await websocket.accept()
-    try:
-        data = await websocket.receive_json()
-        topic = data.get("topic")
-        from langchain_core.messages import HumanMessage
-        inputs = {"messages": [HumanMessage(content=topic)]}
+    loop = asyncio.get_running_loop()
+    queue = SendQueue(loop, maxsize=SEND_QUEUE_SIZE)
+    runs = {}
 
-        import asyncio, threading
+    async def sender():
+        while True:
+            event = await queue.get()
+            if event is None:
+                return
+            await websocket.send_text(_encode(event))
 
-        loop = asyncio.get_event_loop()
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            queue.put(make_event("heartbeat"))
 
-        def worker():
-            # stream intermediate outputs
+    tasks = [asyncio.create_task(sender()), asyncio.create_task(heartbeat())]
+    try:
+        while True:
             try:
-                for output in stream_agent(inputs):
-                    coro = websocket.send_json(output)
-                    asyncio.run_coroutine_threadsafe(coro, loop)
-                # final state
-                final = run_agent(inputs)
-                if "messages" in final:
-                    msgs = [getattr(m, 'content', str(m)) for m in final["messages"]]
-                    coro = websocket.send_json({"final": msgs})
-                else:
-                    coro = websocket.send_json({"final": final})
-                asyncio.run_coroutine_threadsafe(coro, loop)
-            except Exception:
-                pass
-
-        t = threading.Thread(target=worker, daemon=True)
-        t.start()
-
-        # keep connection open while worker runs
-        while t.is_alive():
-            await asyncio.sleep(0.1)
-
-        await websocket.close()
+                msg = await websocket.receive_json()
+            except ValueError:
+                queue.put(make_event("error", message="invalid JSON"), timeout=0)
+                continue
+            kind = msg.get("type", "run") if isinstance(msg, dict) else None
+            if kind == "run":
+                topic = msg.get("topic")
+                run_id = str(msg.get("run") or new_run_id())
+                if not topic:
+                    queue.put(make_event("error", run_id, message="missing topic"), timeout=0)
+                    continue
+                if run_id in runs:
+                    queue.put(make_event("error", run_id, message="run id already active"), timeout=0)
+                    continue
+                cancelled = threading.Event()
+                runs[run_id] = cancelled
+                _start_run(queue, topic, run_id, cancelled, on_done=lambda rid=run_id: runs.pop(rid, None))
+            elif kind == "cancel":
+                cancelled = runs.get(str(msg.get("run")))
+                if cancelled:
+                    cancelled.set()
+            else:
+                queue.put(make_event("error", message=f"unknown message type: {kind}"), timeout=0)
     except WebSocketDisconnect:
-        return
+        pass
+    finally:
+        for cancelled in list(runs.values()):
+            cancelled.set()
+        queue.close()
+        for task in tasks:
+            task.cancel()
+
+
+@app.get("/sse/run")
+async def sse_run(topic: str):
+    """Server-Sent Events alternative to `/ws/run` for a single run.
+
+    Each protocol event is sent as `event: <type>` with the JSON event as data;
+    idle periods are filled with comment heartbeats.
+    """
+    loop = asyncio.get_running_loop()
+    queue = SendQueue(loop, maxsize=SEND_QUEUE_SIZE)
+    cancelled = threading.Event()
+    run_id = new_run_id()
+    _start_run(queue, topic, run_id, cancelled, on_done=queue.close)
+
+    async def body():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None:
+                    return
+                yield f"id: {event.get('seq', '')}\nevent: {event['type']}\ndata: {_encode(event)}\n\n"
+        finally:
+            # client went away or the run finished
+            cancelled.set()
+            queue.close()
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(body(), media_type="text/event-stream", headers=headers)
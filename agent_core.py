@@ -2,6 +2,8 @@
 This module gracefully falls back to mock LLM/search if APIs aren't configured.
 """
 from typing import Generator
+from datetime import datetime, timedelta
+import operator
 import os
 from config import apply_env, missing_keys
 
@@ -47,18 +49,54 @@ class MockSearch:
 LLM_AVAILABLE = ChatNVIDIA and bool(os.getenv("NVIDIA_API_KEY"))
 SEARCH_AVAILABLE = TavilySearch and bool(os.getenv("TAVILY_API_KEY"))
 
-llm = ChatNVIDIA(model="nvidia/llama-3.1-nemotron-70b-instruct") if LLM_AVAILABLE else MockLLM()
+# Offline, a train/ checkpoint can replace MockLLM (see local_llm.py)
+LOCAL_LLM_CHECKPOINT = os.getenv("LOCAL_LLM_CHECKPOINT")
+
+if LLM_AVAILABLE:
+    llm = ChatNVIDIA(model="nvidia/llama-3.1-nemotron-70b-instruct")
+elif LOCAL_LLM_CHECKPOINT:
+    from local_llm import LocalLLM
+    llm = LocalLLM.from_checkpoint(
+        LOCAL_LLM_CHECKPOINT,
+        tokenizer=os.getenv("LOCAL_LLM_TOKENIZER") or None,
+        max_new_tokens=int(os.getenv("LOCAL_LLM_MAX_NEW_TOKENS", "64")),
+        max_batch_size=int(os.getenv("LOCAL_LLM_MAX_BATCH", "8")),
+        max_wait_ms=float(os.getenv("LOCAL_LLM_MAX_WAIT_MS", "10")),
+    )
+else:
+    llm = MockLLM()
 search_tool = TavilySearch(max_results=3) if SEARCH_AVAILABLE else MockSearch(max_results=3)
 
 
+# Refresh mode: evidence older than this is re-queried; topics at least this
+# similar to a saved run reuse its plan.
+REFRESH_MAX_AGE_HOURS = float(os.getenv("REFRESH_MAX_AGE_HOURS", "24"))
+REFRESH_SIMILARITY = float(os.getenv("REFRESH_SIMILARITY", "0.85"))
+
+
 class AgentState(TypedDict):
     messages: Annotated[List, add_messages]
     research_plan: List[str]
-    collected_data: List[str]
+    collected_data: Annotated[List[str], operator.add]
+    # structured evidence ({"goal", "text", "ts"}) persisted for refresh runs
+    evidence: Annotated[List[dict], operator.add]
+    reused_goals: List[str]
+    refresh: bool
     steps_taken: int
 
 
+def _timestamp(now=None):
+    return (now or datetime.utcnow()).isoformat() + "Z"
+
+
+def _format_evidence(goal, text):
+    return f"Goal: {goal}\nResult: {text}"
+
+
 def planner(state: AgentState):
+    if state.get("refresh"):
+        # plan (only the stale goals) and reused evidence were supplied by refresh_agent
+        return {"steps_taken": 0}
     query = state["messages"][0].content
     prompt = f"Break this into 3 specific research goals: {query}. Output only a numbered list."
     response = llm.invoke([SystemMessage(content="You are a Technical Researcher."), HumanMessage(content=prompt)])
@@ -77,7 +115,11 @@ def researcher(state: AgentState):
         return {"collected_data": ["[no plan]"], "steps_taken": idx + 1}
     task = plan[idx % len(plan)]
     results = search_tool.invoke({"query": task})
-    return {"collected_data": [f"Goal: {task}\nResult: {results}"], "steps_taken": idx + 1}
+    return {
+        "collected_data": [_format_evidence(task, results)],
+        "evidence": [{"goal": task, "text": str(results), "ts": _timestamp()}],
+        "steps_taken": idx + 1,
+    }
 
 
 def writer(state: AgentState):
@@ -98,16 +140,19 @@ builder.add_node("planner", planner)
 builder.add_node("researcher", researcher)
 builder.add_node("writer", writer)
 builder.add_edge(START, "planner")
-builder.add_edge("planner", "researcher")
+builder.add_conditional_edges("planner", router)
 builder.add_conditional_edges("researcher", router)
 builder.add_edge("writer", END)
 
 AGENT_APP = builder.compile()
 
 
-def stream_agent(inputs) -> Generator:
-    """Yield intermediate outputs from the agent graph (mirrors StateGraph.stream)."""
-    for output in AGENT_APP.stream(inputs):
+def stream_agent(inputs, **kwargs) -> Generator:
+    """Yield intermediate outputs from the agent graph (mirrors StateGraph.stream).
+
+    Extra keyword arguments (e.g. `stream_mode`) are passed to `StateGraph.stream`.
+    """
+    for output in AGENT_APP.stream(inputs, **kwargs):
         yield output
 
 
@@ -115,4 +160,73 @@ def run_agent(inputs):
     return AGENT_APP.invoke(inputs)
 
 
-__all__ = ["stream_agent", "run_agent", "AGENT_APP"]
+def partition_evidence(plan, evidence, max_age, now=None):
+    """Split a saved plan into reusable evidence and goals that need re-querying.
+
+    A goal is reused only if every evidence entry for it is younger than
+    `max_age` (a timedelta). Returns (fresh_evidence, stale_goals).
+    """
+    now = now or datetime.utcnow()
+    by_goal = {}
+    for entry in evidence:
+        by_goal.setdefault(entry.get("goal"), []).append(entry)
+    fresh, stale = [], []
+    for goal in plan:
+        entries = by_goal.get(goal, [])
+        try:
+            ok = bool(entries) and all(
+                now - datetime.fromisoformat(e["ts"].rstrip("Z")) <= max_age for e in entries
+            )
+        except (KeyError, TypeError, ValueError):
+            ok = False
+        if ok:
+            fresh.extend(entries)
+        else:
+            stale.append(goal)
+    return fresh, stale
+
+
+def refresh_agent(topic, max_age_hours=None, similarity=None, save=True, now=None):
+    """Research `topic`, reusing evidence from a saved run of a similar topic.
+
+    Goals whose evidence is older than `max_age_hours` are searched again and
+    the report is regenerated from the merged evidence. The returned state has
+    `reused_goals` and `refreshed_goals`; with `save` the run (plan and
+    evidence included) is stored for the next refresh.
+    """
+    import storage
+
+    max_age = timedelta(hours=REFRESH_MAX_AGE_HOURS if max_age_hours is None else max_age_hours)
+    prior = storage.find_similar_run(topic, REFRESH_SIMILARITY if similarity is None else similarity)
+    inputs = {"messages": [HumanMessage(content=topic)]}
+    plan = None
+    if prior:
+        meta = prior.get("metadata", {})
+        plan = meta.get("plan") or []
+        fresh, stale = partition_evidence(plan, meta.get("evidence") or [], max_age, now)
+        reused = [goal for goal in plan if goal not in stale]
+        inputs.update({
+            "refresh": True,
+            "research_plan": stale,
+            "collected_data": [_format_evidence(e["goal"], e["text"]) for e in fresh],
+            "evidence": fresh,
+            "reused_goals": reused,
+        })
+    final = run_agent(inputs)
+    if plan is None:
+        plan = final.get("research_plan", [])
+    final["reused_goals"] = final.get("reused_goals", [])
+    final["refreshed_goals"] = [goal for goal in plan if goal not in final["reused_goals"]]
+    if save:
+        report = final["messages"][-1].content if final.get("messages") else ""
+        storage.save_run(topic, report, metadata={
+            "plan": plan,
+            "evidence": final.get("evidence", []),
+            "reused_goals": final["reused_goals"],
+            "refreshed_goals": final["refreshed_goals"],
+            "refreshed_from": prior.get("id") if prior else None,
+        })
+    return final
+
+
+__all__ = ["stream_agent", "run_agent", "refresh_agent", "partition_evidence", "AGENT_APP"]
@@ -0,0 +1,219 @@
+"""Compact, versioned event protocol for streaming agent runs.
+
+Raw StateGraph updates carry whole message objects and state dicts. This module
+translates them into small delta events that are cheap to serialize and send:
+
+    {"v": 1, "run": "<run id>", "seq": 3, "type": "evidence_added", ...}
+
+Event types:
+- run_started: {"topic"}
+- plan: {"goals"}
+- node_complete: {"node", "step"}
+- evidence_added: {"goal", "text"}
+- token: {"node", "text"} (only emitted when the LLM streams chunks)
+- final: {"report"}
+- error: {"message"}
+- heartbeat: {} (connection-level, "run" is null)
+
+`SendQueue` is a bounded buffer between the (synchronous) agent thread and the
+async sender. When it is full, token events are coalesced into a queued token
+tail, heartbeats are dropped, and every other event blocks the producer until
+the client catches up, so a slow client applies backpressure instead of piling up
+frames.
+"""
+import asyncio
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+from itertools import count
+
+from langchain_core.messages import HumanMessage, BaseMessageChunk
+
+PROTOCOL_VERSION = 1
+
+COALESCE = "coalesce"
+DROP = "drop"
+BLOCK = "block"
+
+# Overflow policy per event type; anything not listed blocks the producer.
+OVERFLOW_POLICY = {
+    "token": COALESCE,
+    "heartbeat": DROP,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def make_event(type_, run=None, seq=None, **fields):
+    event = {"v": PROTOCOL_VERSION, "run": run, "type": type_}
+    if seq is not None:
+        event["seq"] = seq
+    event.update(fields)
+    return event
+
+
+def encode_event(event):
+    """Serialize an event to JSON text.
+
+    Raises TypeError for values that are not JSON-native so callers can report
+    the failure instead of sending a partial frame.
+    """
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+
+
+def _text(message):
+    return getattr(message, "content", str(message))
+
+
+def _split_evidence(entry):
+    goal, sep, result = entry.partition("\nResult: ")
+    if goal.startswith("Goal: "):
+        goal = goal[len("Goal: "):]
+    return (goal, result) if sep else ("", entry)
+
+
+def events_from_update(node, update):
+    """Translate one StateGraph node update into (type, fields) deltas."""
+    update = update or {}
+    deltas = []
+    if node == "planner" and "research_plan" in update:
+        deltas.append(("plan", {"goals": list(update["research_plan"])}))
+    for entry in update.get("collected_data", []) or []:
+        goal, text = _split_evidence(str(entry))
+        deltas.append(("evidence_added", {"goal": goal, "text": text}))
+    deltas.append(("node_complete", {"node": node, "step": update.get("steps_taken")}))
+    if node == "writer" and update.get("messages"):
+        deltas.append(("final", {"report": _text(update["messages"][-1])}))
+    return deltas
+
+
+def iter_run_events(topic, run_id=None, stream=None, cancelled=None):
+    """Run the agent for `topic` and yield protocol events in order.
+
+    `stream` defaults to `agent_core.stream_agent`. `cancelled` is an optional
+    `threading.Event` checked between graph updates. Failures are reported as a
+    terminal `error` event rather than raised.
+    """
+    if stream is None:
+        from agent_core import stream_agent as stream
+    run_id = run_id or new_run_id()
+    seq = count()
+    yield make_event("run_started", run_id, next(seq), topic=topic)
+    inputs = {"messages": [HumanMessage(content=topic)]}
+    try:
+        for mode, payload in stream(inputs, stream_mode=["updates", "messages"]):
+            if cancelled is not None and cancelled.is_set():
+                yield make_event("error", run_id, next(seq), message="cancelled")
+                return
+            if mode == "messages":
+                chunk, meta = payload
+                # Only true streaming chunks become token events; whole messages
+                # returned by nodes are covered by the `final` event.
+                if isinstance(chunk, BaseMessageChunk) and chunk.content:
+                    node = (meta or {}).get("langgraph_node")
+                    yield make_event("token", run_id, next(seq), node=node, text=_text(chunk))
+                continue
+            for node, update in payload.items():
+                for type_, fields in events_from_update(node, update):
+                    yield make_event(type_, run_id, next(seq), **fields)
+    except Exception as exc:
+        logger.exception("agent run %s failed", run_id)
+        yield make_event("error", run_id, next(seq), message=f"{type(exc).__name__}: {exc}")
+
+
+class SendQueue:
+    """Bounded, thread-safe event buffer with per-type overflow policies.
+
+    Producers call `put` from worker threads; a single async consumer awaits
+    `get`. `loop` is the event loop the consumer runs on.
+    """
+
+    def __init__(self, loop, maxsize=64):
+        self.loop = loop
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.coalesced = 0
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._ready = asyncio.Event()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._items)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _notify(self):
+        self.loop.call_soon_threadsafe(self._ready.set)
+
+    def put(self, event, timeout=None):
+        """Enqueue an event, applying the overflow policy when full.
+
+        Returns False if the event was dropped or the queue is closed.
+        """
+        policy = OVERFLOW_POLICY.get(event.get("type"), BLOCK)
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._items) >= self.maxsize:
+                tail = self._items[-1] if self._items else None
+                if (
+                    policy == COALESCE
+                    and tail is not None
+                    and tail.get("type") == event.get("type")
+                    and tail.get("run") == event.get("run")
+                    and tail.get("node") == event.get("node")
+                ):
+                    tail["text"] = tail.get("text", "") + event.get("text", "")
+                    tail["seq"] = event.get("seq", tail.get("seq"))
+                    self.coalesced += 1
+                    return True
+                if policy == DROP:
+                    self.dropped += 1
+                    return False
+                if not self._cond.wait_for(
+                    lambda: self._closed or len(self._items) < self.maxsize, timeout
+                ) or self._closed:
+                    return False
+            self._items.append(event)
+        self._notify()
+        return True
+
+    async def get(self):
+        """Wait for and return the next event, or None once closed and drained."""
+        while True:
+            with self._cond:
+                if self._items:
+                    event = self._items.popleft()
+                    self._cond.notify_all()
+                    return event
+                if self._closed:
+                    return None
+                self._ready.clear()
+            await self._ready.wait()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._notify()
+
+
+__all__ = [
+    "PROTOCOL_VERSION",
+    "OVERFLOW_POLICY",
+    "SendQueue",
+    "encode_event",
+    "events_from_update",
+    "iter_run_events",
+    "make_event",
+    "new_run_id",
+]
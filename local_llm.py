@@ -0,0 +1,211 @@
+"""Local LLM provider backed by a `train/` TinyTransformerLM checkpoint.
+
+`LocalLLM.invoke(messages)` matches the interface `agent_core` expects from
+ChatNVIDIA/MockLLM. Requests from concurrent callers (e.g. parallel `/run`
+calls, each served on its own thread) are grouped by `MicroBatcher` into one
+padded `generate()` call, waiting at most `max_wait_ms` for a batch to fill.
+
+Enable it in `agent_core` by setting LOCAL_LLM_CHECKPOINT to a checkpoint path.
+Run `python local_llm.py --benchmark` to compare batch windows.
+"""
+import argparse
+import os
+import queue
+import statistics
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_core.messages import AIMessage
+
+from train.checkpoint import load_checkpoint
+from train.model import TinyTransformerLM
+from train.tokenizer import ByteBPETokenizer
+
+
+class ByteTokenizer:
+    """UTF-8 bytes shifted by one so that id 0 stays the padding token.
+
+    Only for byte-level checkpoints; models trained on a `prepare_reports.py`
+    corpus need the `ByteBPETokenizer` embedded in their checkpoint.
+    """
+
+    vocab_size = 257
+    eos_id = None
+
+    def encode(self, text):
+        return [b + 1 for b in text.encode("utf-8")]
+
+    def decode(self, ids):
+        return bytes(i - 1 for i in ids if 1 <= i <= 256).decode("utf-8", errors="replace")
+
+
+class MicroBatcher:
+    """Groups concurrent single-item calls into batched calls of `fn`.
+
+    `fn` takes a list of items and returns a list of results in the same
+    order. The first queued item starts a batch window of `max_wait_ms`; the
+    batch is flushed once it holds `max_batch_size` items or the window ends.
+    `batches`, `items` and `max_batch` are running totals for monitoring.
+    """
+
+    def __init__(self, fn, max_batch_size=8, max_wait_ms=10.0):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.items = 0
+        self.max_batch = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        fut = Future()
+        self._queue.put((item, fut))
+        return fut
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.items += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+            try:
+                results = self.fn([item for item, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                fut.set_result(result)
+
+
+class LocalLLM:
+    """Serves a TinyTransformerLM through a `MicroBatcher`."""
+
+    def __init__(self, model, tokenizer=None, max_new_tokens=64, temperature=0.8, top_k=40,
+                 max_batch_size=8, max_wait_ms=10.0):
+        self.model = model.eval()
+        self.tokenizer = tokenizer or ByteTokenizer()
+        if model.token_emb.num_embeddings < self.tokenizer.vocab_size:
+            raise ValueError(f"model vocab_size {model.token_emb.num_embeddings} is smaller than the "
+                             f"tokenizer vocabulary ({self.tokenizer.vocab_size})")
+        # reserve at least half of the model's context for the prompt
+        self.max_new_tokens = max(1, min(max_new_tokens, model.max_len // 2))
+        self.temperature = temperature
+        self.top_k = top_k
+        self.batcher = MicroBatcher(self._generate_batch, max_batch_size, max_wait_ms)
+
+    @classmethod
+    def from_checkpoint(cls, path, tokenizer=None, **kwargs):
+        """Load a train.py checkpoint.
+
+        `tokenizer` may be a tokenizer object or a `tokenizer.json` path; by
+        default the tokenizer embedded in the checkpoint is used, falling back
+        to `ByteTokenizer`.
+        """
+        state = load_checkpoint(path)
+        model = TinyTransformerLM(**state.get("config", {}))
+        model.load_state_dict(state["model"])
+        if isinstance(tokenizer, (str, os.PathLike)):
+            tokenizer = ByteBPETokenizer.load(tokenizer)
+        elif tokenizer is None and "tokenizer" in state:
+            tokenizer = ByteBPETokenizer.from_state(state["tokenizer"])
+        return cls(model, tokenizer=tokenizer, **kwargs)
+
+    def _generate_batch(self, prompts):
+        budget = self.model.max_len - self.max_new_tokens
+        eos = self.tokenizer.eos_id
+        # keep the most recent context that fits; never send an empty prompt
+        ids = [(self.tokenizer.encode(p) or [1])[-budget:] for p in prompts]
+        out = self.model.generate(ids, self.max_new_tokens, temperature=self.temperature, top_k=self.top_k,
+                                  eos_id=eos)
+        rows = out.tolist()
+        if eos is not None:
+            rows = [row[:row.index(eos)] if eos in row else row for row in rows]
+        return [self.tokenizer.decode(row) for row in rows]
+
+    def invoke(self, messages):
+        if isinstance(messages, str):
+            prompt = messages
+        else:
+            prompt = "\n".join(getattr(m, "content", str(m)) for m in messages)
+        return AIMessage(content=self.batcher(prompt))
+
+
+def benchmark(llm, windows=(0.0, 2.0, 10.0, 50.0), clients=16, requests_per_client=4):
+    """Throughput and latency with `clients` concurrent callers per batch window."""
+    rows = []
+    prompt = "Summarize recent advances in efficient transformer inference."
+    for window in windows:
+        llm.batcher = MicroBatcher(llm._generate_batch, llm.batcher.max_batch_size, window)
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            for _ in range(requests_per_client):
+                t0 = time.perf_counter()
+                llm.invoke(prompt)
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        latencies.sort()
+        row = {
+            "window_ms": window,
+            "req_s": len(latencies) / elapsed,
+            "tok_s": len(latencies) * llm.max_new_tokens / elapsed,
+            "p50_ms": 1000 * statistics.median(latencies),
+            "p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))],
+            "mean_batch": llm.batcher.items / max(1, llm.batcher.batches),
+        }
+        rows.append(row)
+        print(f"window={window:5.1f} ms  req/s={row['req_s']:7.2f}  tok/s={row['tok_s']:8.0f}  "
+              f"p50={row['p50_ms']:7.1f} ms  p95={row['p95_ms']:7.1f} ms  mean_batch={row['mean_batch']:.2f}")
+    return rows
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--checkpoint", type=str, default=None, help="train.py checkpoint; random init if omitted")
+    p.add_argument("--tokenizer", type=str, default=None, help="tokenizer.json (default: embedded in the checkpoint)")
+    p.add_argument("--max-new-tokens", type=int, default=32)
+    p.add_argument("--max-batch-size", type=int, default=8)
+    p.add_argument("--clients", type=int, default=16)
+    p.add_argument("--benchmark", action="store_true")
+    p.add_argument("prompt", nargs="?", default="Hello")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    cfg = parse_args()
+    kwargs = {"max_new_tokens": cfg.max_new_tokens, "max_batch_size": cfg.max_batch_size}
+    if cfg.checkpoint:
+        llm = LocalLLM.from_checkpoint(cfg.checkpoint, tokenizer=cfg.tokenizer, **kwargs)
+    else:
+        llm = LocalLLM(TinyTransformerLM(vocab_size=ByteTokenizer.vocab_size), **kwargs)
+    if cfg.benchmark:
+        benchmark(llm, clients=cfg.clients)
+    else:
+        print(llm.invoke(cfg.prompt).content)
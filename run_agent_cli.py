@@ -1,19 +1,26 @@
 """CLI to run the Deep Research Agent from the command line."""
 import argparse
-from agent_core import run_agent
+from agent_core import run_agent, refresh_agent
 from langchain_core.messages import HumanMessage
 
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("topic", type=str, help="Research topic to run")
+    p.add_argument("--refresh", action="store_true", help="Reuse fresh evidence from a saved run of a similar topic")
+    p.add_argument("--max-age-hours", type=float, default=None, help="Staleness window for --refresh")
     return p.parse_args()
 
 
 def main():
     cfg = parse_args()
-    inputs = {"messages": [HumanMessage(content=cfg.topic)]}
-    final = run_agent(inputs)
+    if cfg.refresh:
+        final = refresh_agent(cfg.topic, max_age_hours=cfg.max_age_hours)
+        print(f"Reused goals: {final['reused_goals']}")
+        print(f"Refreshed goals: {final['refreshed_goals']}")
+    else:
+        inputs = {"messages": [HumanMessage(content=cfg.topic)]}
+        final = run_agent(inputs)
     if "messages" in final:
         print(final["messages"][-1].content)
     else:
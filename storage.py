@@ -1,3 +1,4 @@
+import difflib
 import json
 from pathlib import Path
 from datetime import datetime
@@ -35,3 +36,29 @@ def save_run(topic: str, report: str, metadata: dict | None = None):
 def list_runs(limit: int = 50):
     runs = _load_runs()
     return runs[:limit]
+
+
+def _normalize_topic(topic: str):
+    return " ".join(topic.lower().split())
+
+
+def find_similar_run(topic: str, threshold: float = 0.85):
+    """Return the most recent saved run with a stored plan whose topic is at least
+    `threshold` similar (difflib ratio) to `topic`, or None."""
+    target = _normalize_topic(topic)
+    # runs are stored newest first, so the first match is the most recent
+    for run in _load_runs():
+        if not run.get("metadata", {}).get("plan"):
+            continue
+        if difflib.SequenceMatcher(None, target, _normalize_topic(run.get("topic", ""))).ratio() >= threshold:
+            return run
+    return None
+
+
+def iter_reports(path=None):
+    """Yield (topic, report) for every saved run with a non-empty report."""
+    runs = _load_runs() if path is None else json.loads(Path(path).read_text(encoding="utf-8"))
+    for run in runs:
+        report = run.get("report") or ""
+        if report.strip():
+            yield run.get("topic", ""), report
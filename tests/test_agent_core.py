@@ -7,3 +7,43 @@ def test_agent_run_returns_state():
     final = run_agent(inputs)
     # final should be a dict and contain either messages or state
     assert isinstance(final, dict)
+
+
+def test_refresh_reuses_fresh_evidence(tmp_path, monkeypatch):
+    from datetime import datetime, timedelta
+    import agent_core
+    import storage
+
+    monkeypatch.setattr(storage, "RUNS_PATH", tmp_path / "runs.json")
+    calls = []
+    real_invoke = agent_core.search_tool.invoke
+    monkeypatch.setattr(agent_core.search_tool, "invoke", lambda p: calls.append(p) or real_invoke(p))
+
+    first = agent_core.refresh_agent("Daily GPU market monitoring")
+    assert first["reused_goals"] == [] and len(first["refreshed_goals"]) == 3
+    assert len(calls) == 3
+
+    # age one goal's evidence past the staleness window
+    runs = storage._load_runs()
+    old = (datetime.utcnow() - timedelta(hours=48)).isoformat() + "Z"
+    runs[0]["metadata"]["evidence"][0]["ts"] = old
+    storage._save_runs(runs)
+
+    second = agent_core.refresh_agent("daily GPU market  monitoring", max_age_hours=24)
+    plan = runs[0]["metadata"]["plan"]
+    assert second["refreshed_goals"] == plan[:1]
+    assert second["reused_goals"] == plan[1:]
+    assert len(calls) == 4
+    assert len(second["evidence"]) == 3
+
+
+def test_find_similar_run_prefers_most_recent_match(tmp_path, monkeypatch):
+    import storage
+
+    monkeypatch.setattr(storage, "RUNS_PATH", tmp_path / "runs.json")
+    plan = {"plan": ["q"]}
+    storage.save_run("kv cache compression", "old", plan)
+    storage.save_run("kv cache compressions", "new", plan)
+    storage.save_run("unrelated topic", "other", plan)
+    assert storage.find_similar_run("kv cache compression", 0.9)["report"] == "new"
+    assert storage.find_similar_run("protein folding", 0.9) is None
@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from agent_api import app
+from agent_events import SendQueue, iter_run_events, make_event
+
+
+def test_run_events_are_compact_deltas():
+    events = list(iter_run_events("Test topic", run_id="r1"))
+    types = [e["type"] for e in events]
+    assert types[0] == "run_started" and types[-1] == "final"
+    assert types.count("evidence_added") == 3
+    assert [e["seq"] for e in events] == list(range(len(events)))
+    assert all(e["v"] == 1 and e["run"] == "r1" for e in events)
+    for e in events:
+        json.dumps(e)
+
+
+def test_send_queue_coalesces_tokens_and_drops_heartbeats():
+    async def scenario():
+        q = SendQueue(asyncio.get_running_loop(), maxsize=1)
+        assert q.put(make_event("token", "r", 0, node="writer", text="ab"))
+        assert q.put(make_event("token", "r", 1, node="writer", text="cd"))
+        assert not q.put(make_event("heartbeat"))
+        # a blocking event cannot enter a full queue without waiting
+        assert not q.put(make_event("final", "r", 2, report="x"), timeout=0)
+        first = await q.get()
+        q.close()
+        return first, q.dropped, await q.get()
+
+    first, dropped, tail = asyncio.run(scenario())
+    assert first["text"] == "abcd" and first["seq"] == 1
+    assert dropped == 1
+    assert tail is None
+
+
+def test_sse_endpoint_streams_events():
+    client = TestClient(app)
+    with client.stream("GET", "/sse/run", params={"topic": "Test topic"}) as resp:
+        body = "".join(resp.iter_text())
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    assert "event: run_started" in body and "event: final" in body
+
+
+def test_websocket_multiple_runs_per_connection():
+    client = TestClient(app)
+    with client.websocket_connect("/ws/run") as ws:
+        ws.send_json({"type": "run", "topic": "first", "run": "a"})
+        ws.send_json({"type": "run", "topic": "second", "run": "b"})
+        finished = set()
+        while finished != {"a", "b"}:
+            event = ws.receive_json()
+            if event["type"] == "final":
+                finished.add(event["run"])
+
+
+def test_websocket_invalid_json_keeps_connection_open():
+    client = TestClient(app)
+    with client.websocket_connect("/ws/run") as ws:
+        ws.send_text("not json")
+        event = ws.receive_json()
+        assert event["type"] == "error" and event["message"] == "invalid JSON"
+        ws.send_json({"type": "run", "topic": "after error", "run": "a"})
+        while event["type"] != "final":
+            event = ws.receive_json()
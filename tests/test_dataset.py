@@ -1,3 +1,4 @@
+import torch
 from train.dataset import SyntheticSeqDataset
 
 
@@ -7,3 +8,107 @@ def test_dataset_len_and_shape():
     assert len(ds) == 10
     assert x.shape[0] == 16
     assert y.shape[0] == 16
+
+
+def test_batch_dataset_is_vectorized_and_seeded():
+    from train.dataset import SyntheticBatchDataset, make_loader
+
+    a = SyntheticBatchDataset(num_samples=10, seq_len=8, vocab_size=50, seed=3)
+    b = SyntheticBatchDataset(num_samples=10, seq_len=8, vocab_size=50, seed=3, materialize=False)
+    x, y = a[[0, 1, 2]]
+    assert x.shape == (3, 8) and (y[:, :-1] == x[:, 1:]).all() and (y[:, -1] == 0).all()
+    assert (b[[4, 5]][0] == b[[4, 5]][0]).all()
+    # each sample depends only on its own index, not on the rest of the batch
+    assert (b[[4, 5]][0][0] == b[[4, 7]][0][0]).all()
+    assert not (b[[4, 5]][0][1] == b[[4, 7]][0][1]).all()
+    assert (b[5][0] == b[[3, 5]][0][1]).all()
+    assert b[[0, 1, 2]][0].min() >= 1 and b[[0, 1, 2]][0].max() < 50
+    other = SyntheticBatchDataset(num_samples=10, seq_len=8, vocab_size=50, seed=4, materialize=False)
+    assert not (other[5][0] == b[5][0]).all()
+    batches = list(make_loader(a, batch_size=4))
+    assert [bx.shape[0] for bx, _ in batches] == [4, 4, 2]
+
+
+def test_memmap_token_dataset(tmp_path):
+    import numpy as np
+    from train.dataset import MemmapTokenDataset, write_token_shard
+
+    write_token_shard(tmp_path / "a.bin", np.arange(1, 22), dtype="uint16")
+    write_token_shard(tmp_path / "b.bin", np.arange(100, 111), dtype="uint16")
+    ds = MemmapTokenDataset(tmp_path, seq_len=5)
+    assert len(ds) == 4 + 2
+    x, y = ds[4]
+    assert x.tolist() == [100, 101, 102, 103, 104] and y.tolist() == [101, 102, 103, 104, 105]
+    bx, by = ds[[0, 5]]
+    assert bx.shape == (2, 5) and bx.dtype == by.dtype == torch.long
+
+
+def test_make_loader_with_distributed_sampler():
+    from torch.utils.data.distributed import DistributedSampler
+    from train.dataset import SyntheticBatchDataset, make_loader
+
+    ds = SyntheticBatchDataset(num_samples=16, seq_len=4, vocab_size=50)
+    seen = []
+    for rank in range(2):
+        sampler = DistributedSampler(ds, num_replicas=2, rank=rank, shuffle=False)
+        seen.append(torch.cat([x for x, _ in make_loader(ds, 4, sampler=sampler)]))
+    assert seen[0].shape == (8, 4) and not torch.equal(seen[0], seen[1])
+
+
+def test_packed_dataset_masks_document_boundaries(tmp_path):
+    from train.dataset import PackedTokenDataset, write_token_shard
+
+    eos = 257
+    write_token_shard(tmp_path / "a.bin", [5, 6, 7, eos, 8, 9, eos])
+    write_token_shard(tmp_path / "b.bin", [10, 11, 12, eos])
+    ds = PackedTokenDataset(tmp_path, seq_len=4, eos_id=eos, shuffle=False)
+    windows = list(ds)
+    assert len(windows) == len(ds) == 3
+    x, y, seg = windows[0]
+    assert x.tolist() == [5, 6, 7, eos] and y.tolist() == [6, 7, eos, 0]
+    assert seg.tolist() == [0, 0, 0, 0]
+    # windows continue across shard boundaries
+    x, y, seg = windows[1]
+    assert x.tolist() == [8, 9, eos, 10] and y.tolist() == [9, eos, 0, 11] and seg.tolist() == [0, 0, 0, 1]
+    stats = ds.stats()
+    assert stats["padding"] == 1 and stats["efficiency"] == 11 / 12
+
+
+def test_packed_dataset_equal_windows_per_rank_and_epoch_seeding(tmp_path, monkeypatch):
+    from train.dataset import PackedTokenDataset, write_token_shard
+
+    write_token_shard(tmp_path / "a.bin", list(range(1, 62)))
+    ds = PackedTokenDataset(tmp_path, seq_len=8, shuffle=True, seed=0)
+    assert len(ds.windows) == 8
+    ds.windows = range(7)  # not divisible by the world size
+
+    per_rank = []
+    for rank in range(2):
+        monkeypatch.setattr(PackedTokenDataset, "_rank_info", staticmethod(lambda r=rank: (r, 2)))
+        per_rank.append([x[0].item() for x, _, _ in ds])
+        assert len(ds) == 4
+    assert [len(w) for w in per_rank] == [4, 4]
+    assert set(per_rank[0] + per_rank[1]) == {ds.window(k)[0][0].item() for k in range(7)}
+
+    # the order depends on the epoch, not on how many times the dataset was iterated
+    monkeypatch.setattr(PackedTokenDataset, "_rank_info", staticmethod(lambda: (0, 1)))
+    ds.set_epoch(3)
+    first = [x[0].item() for x, _, _ in ds]
+    assert first == [x[0].item() for x, _, _ in ds]
+    fresh = PackedTokenDataset(tmp_path, seq_len=8, shuffle=True, seed=0)
+    fresh.windows = range(7)
+    fresh.set_epoch(3)
+    assert [x[0].item() for x, _, _ in fresh] == first
+
+
+def test_packed_loader_workers_yield_whole_batches(tmp_path):
+    from train.dataset import PackedTokenDataset, make_loader, write_token_shard
+
+    write_token_shard(tmp_path / "a.bin", list(range(1, 42)))
+    ds = PackedTokenDataset(tmp_path, seq_len=4, shuffle=False)
+    assert len(ds.windows) == 10
+    dl = make_loader(ds, batch_size=4, num_workers=2)
+    batches = list(dl)
+    assert len(dl) == 3
+    assert [len(x) for x, _, _ in batches] == [4, 4, 2]
+    assert sorted(torch.cat([x[:, 0] for x, _, _ in batches]).tolist()) == [1 + 4 * k for k in range(10)]
@@ -0,0 +1,74 @@
+import threading
+import time
+
+import torch
+
+from local_llm import ByteTokenizer, LocalLLM, MicroBatcher
+from train.model import TinyTransformerLM
+
+
+def test_micro_batcher_groups_concurrent_calls():
+    def fn(items):
+        time.sleep(0.01)
+        return [i * 2 for i in items]
+
+    batcher = MicroBatcher(fn, max_batch_size=4, max_wait_ms=50)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher(i))) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {i: i * 2 for i in range(8)}
+    assert batcher.max_batch > 1
+    assert batcher.items == 8 and batcher.batches < 8
+
+
+def test_local_llm_invoke_from_checkpoint(tmp_path):
+    from langchain_core.messages import HumanMessage
+
+    model = TinyTransformerLM(vocab_size=ByteTokenizer.vocab_size, d_model=32, num_layers=1, max_len=64)
+    path = tmp_path / "ckpt.pt"
+    torch.save({"config": model.config, "model": model.state_dict()}, path)
+    llm = LocalLLM.from_checkpoint(path, max_new_tokens=8)
+    out = llm.invoke([HumanMessage(content="x" * 100)])
+    assert isinstance(out.content, str)
+
+
+def test_local_llm_reserves_prompt_budget():
+    torch.manual_seed(0)
+    model = TinyTransformerLM(vocab_size=ByteTokenizer.vocab_size, d_model=32, num_layers=1, max_len=32)
+    llm = LocalLLM(model, max_new_tokens=64, temperature=0)
+    assert llm.max_new_tokens == 16
+    # prompts sharing their last byte must still produce different outputs
+    assert llm.invoke("abcdefgh").content != llm.invoke("zyxwvuth").content
+
+
+def test_local_llm_uses_embedded_bpe_tokenizer(tmp_path):
+    import pytest
+
+    from train.checkpoint import snapshot
+    from train.tokenizer import EOS_ID, ByteBPETokenizer
+
+    tok = ByteBPETokenizer.train(["the cache transformer cache"] * 4, vocab_size=270)
+    merged = max(tok.merges.values())
+    model = TinyTransformerLM(vocab_size=tok.vocab_size, d_model=32, num_layers=1, max_len=32)
+    with torch.no_grad():
+        # make greedy decoding always emit a learned merge
+        model.head.weight.zero_()
+        model.head.bias.zero_()
+        model.head.bias[merged] = 1.0
+    opt = torch.optim.Adam(model.parameters())
+    path = tmp_path / "ckpt.pt"
+    torch.save(snapshot(model, opt, 0, 0, tok.state_dict()), path)
+    llm = LocalLLM.from_checkpoint(path, max_new_tokens=8, temperature=0)
+    assert isinstance(llm.tokenizer, ByteBPETokenizer)
+    assert llm.invoke("cache").content == tok.decode([merged] * 8)
+
+    with torch.no_grad():
+        llm.model.head.bias[EOS_ID] = 2.0
+    assert llm.invoke("cache").content == ""
+
+    small = TinyTransformerLM(vocab_size=ByteTokenizer.vocab_size, d_model=32, num_layers=1, max_len=32)
+    with pytest.raises(ValueError, match="vocab"):
+        LocalLLM(small, tokenizer=tok)
@@ -7,3 +7,42 @@ def test_model_forward():
     x = torch.randint(1, 128, (2, 32), dtype=torch.long)
     logits = model(x)
     assert logits.shape == (2, 32, 128)
+
+
+def test_model_is_causal():
+    torch.manual_seed(0)
+    model = TinyTransformerLM(vocab_size=64, d_model=32, num_layers=2, max_len=16).eval()
+    x = torch.randint(1, 64, (1, 16))
+    y = x.clone()
+    y[0, 10:] = torch.randint(1, 64, (6,))
+    assert torch.allclose(model(x)[:, :10], model(y)[:, :10], atol=1e-5)
+
+
+def test_generate_cached_matches_uncached_and_padding():
+    torch.manual_seed(0)
+    model = TinyTransformerLM(vocab_size=64, d_model=32, num_layers=2, max_len=32)
+    prompts = [[5, 6, 7, 8, 9], [3, 4]]
+    cached = model.generate(prompts, 8, temperature=0)
+    uncached = model.generate(prompts, 8, temperature=0, use_cache=False)
+    assert cached.shape == (2, 8)
+    assert torch.equal(cached, uncached)
+    # a left-padded prompt decodes like the same prompt on its own
+    assert torch.equal(cached[1], model.generate([[3, 4]], 8, temperature=0)[0])
+    sampled = model.generate(prompts, 4, temperature=0.8, top_k=5)
+    assert sampled.shape == (2, 4) and int(sampled.min()) >= 0
+
+
+def test_segment_ids_isolate_packed_documents():
+    torch.manual_seed(0)
+    model = TinyTransformerLM(vocab_size=64, d_model=32, num_layers=2, max_len=16).eval()
+    doc = torch.tensor([[7, 8, 9, 10]])
+    packed = torch.cat([torch.randint(1, 64, (1, 5)), doc], dim=1)
+    seg = torch.tensor([[0] * 5 + [1] * 4])
+    assert torch.allclose(model(packed, segment_ids=seg)[:, 5:], model(doc), atol=1e-5)
+
+
+def test_cached_prefill_without_mask_is_causal():
+    torch.manual_seed(0)
+    model = TinyTransformerLM(vocab_size=64, d_model=32, num_layers=2, max_len=16).eval()
+    x = torch.randint(1, 64, (2, 10))
+    assert torch.allclose(model(x, caches=model.new_cache(2)), model(x), atol=1e-5)
@@ -0,0 +1,20 @@
+import torch
+
+from train.dataset import SyntheticBatchDataset, make_loader
+from train.model import TinyTransformerLM
+from train.quantize import load_model, perplexity, quantize, save_quantized
+
+
+def test_quantized_roundtrip_and_drift(tmp_path):
+    torch.manual_seed(0)
+    model = TinyTransformerLM(vocab_size=128, d_model=64, num_layers=1, max_len=32).eval()
+    loader = make_loader(SyntheticBatchDataset(num_samples=16, seq_len=32, vocab_size=128), 8)
+    qmodel = quantize(model)
+    ppl_fp32, ppl_int8 = perplexity(model, loader), perplexity(qmodel, loader)
+    assert abs(ppl_int8 - ppl_fp32) / ppl_fp32 < 0.05
+
+    path = tmp_path / "int8.pt"
+    save_quantized(qmodel, model.config, path)
+    loaded = load_model(path)
+    x = torch.randint(1, 128, (2, 16))
+    assert torch.allclose(loaded(x), qmodel(x))
@@ -0,0 +1,14 @@
+from train.tokenizer import EOS_ID, ByteBPETokenizer
+
+
+def test_bpe_train_roundtrip(tmp_path):
+    texts = ["the cache hit rate of the cache", "the kv cache grows with the context"] * 5
+    tok = ByteBPETokenizer.train(texts, vocab_size=300)
+    assert 258 < tok.vocab_size <= 300
+    ids = tok.encode("the cache, héllo")
+    assert len(ids) < len("the cache, héllo".encode("utf-8"))
+    assert tok.decode(ids) == "the cache, héllo"
+    assert tok.encode_document("x")[-1] == EOS_ID
+
+    tok.save(tmp_path / "tok.json")
+    assert ByteBPETokenizer.load(tmp_path / "tok.json").encode("the cache") == tok.encode("the cache")
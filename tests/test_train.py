@@ -0,0 +1,51 @@
+import os
+
+from train.train import parse_args, train
+
+
+def test_train_bf16_grad_accum(tmp_path):
+    cfg = parse_args([
+        "--amp", "bf16", "--grad-accum", "2", "--log-interval", "2",
+        "--save-dir", str(tmp_path / "ckpt"), "--log-dir", str(tmp_path / "runs"),
+    ])
+    train(cfg)
+    assert os.path.exists(tmp_path / "ckpt" / "ckpt_epoch_1.pt")
+
+
+def test_resume_restores_state_and_keeps_last(tmp_path):
+    import torch
+    from train.checkpoint import list_checkpoints, load_checkpoint
+
+    args = ["--save-dir", str(tmp_path / "ckpt"), "--log-dir", str(tmp_path / "runs"), "--keep-last", "2"]
+    train(parse_args(args + ["--epochs", "2"]))
+    state = load_checkpoint(list_checkpoints(tmp_path / "ckpt")[-1])
+    assert state["epoch"] == 1 and state["step"] > 0 and "rng" in state
+
+    train(parse_args(args + ["--epochs", "3", "--resume"]))
+    paths = list_checkpoints(tmp_path / "ckpt")
+    assert [os.path.basename(p) for p in paths] == ["ckpt_epoch_2.pt", "ckpt_epoch_3.pt"]
+    resumed = load_checkpoint(paths[-1])
+    assert resumed["epoch"] == 2 and resumed["step"] == state["step"] * 3 // 2
+    assert not any(str(p).endswith(".tmp") for p in (tmp_path / "ckpt").iterdir())
+    assert isinstance(resumed["model"]["head.weight"], torch.Tensor)
+
+
+def test_short_accumulation_group_is_averaged(tmp_path, monkeypatch):
+    import torch
+
+    grads = []
+    step = torch.optim.Adam.step
+
+    def record(self, *a, **kw):
+        grads.append(self.param_groups[0]["params"][-1].grad.clone())
+        return step(self, *a, **kw)
+
+    monkeypatch.setattr(torch.optim.Adam, "step", record)
+    # 256 synthetic samples in batches of 128: one group of two micro-batches
+    for accum in ("2", "4"):
+        train(parse_args([
+            "--batch-size", "128", "--grad-accum", accum,
+            "--save-dir", str(tmp_path / accum), "--log-dir", str(tmp_path / "runs"),
+        ]))
+    assert len(grads) == 2
+    assert torch.allclose(grads[0], grads[1])
@@ -0,0 +1,137 @@
+import glob
+import os
+import queue
+import random
+import re
+import threading
+import torch
+
+CKPT_PATTERN = re.compile(r"ckpt_epoch_(\d+)\.pt$")
+
+
+def _to_cpu(obj):
+    """Recursively copy tensors to CPU so training can keep mutating the originals."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+
+def rng_state():
+    state = {"torch": torch.get_rng_state(), "python": random.getstate()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    version, internal, gauss = state["python"]
+    random.setstate((version, tuple(internal), gauss))
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def snapshot(model, opt, epoch, step, tokenizer=None):
+    """CPU copy of everything needed to resume training.
+
+    `tokenizer` (a `ByteBPETokenizer.state_dict()`) is embedded so the
+    checkpoint can be served without the corpus directory.
+    """
+    state = {
+        "config": dict(getattr(model, "config", {})),
+        "model": model.state_dict(),
+        "opt": opt.state_dict(),
+        "epoch": epoch,
+        "step": step,
+        "rng": rng_state(),
+    }
+    if tokenizer is not None:
+        state["tokenizer"] = tokenizer
+    return _to_cpu(state)
+
+
+def list_checkpoints(save_dir):
+    """Checkpoint paths in `save_dir`, oldest epoch first."""
+    paths = [p for p in glob.glob(os.path.join(save_dir, "ckpt_epoch_*.pt")) if CKPT_PATTERN.search(p)]
+    return sorted(paths, key=lambda p: int(CKPT_PATTERN.search(p).group(1)))
+
+
+def latest_checkpoint(save_dir):
+    paths = list_checkpoints(save_dir)
+    return paths[-1] if paths else None
+
+
+def load_checkpoint(path, map_location="cpu"):
+    """Load a checkpoint memory-mapped, so tensors are paged in lazily."""
+    return torch.load(path, map_location=map_location, mmap=True, weights_only=True)
+
+
+def write_atomic(state, path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class AsyncCheckpointer:
+    """Writes checkpoint snapshots on a background thread.
+
+    `save` only takes the CPU snapshot on the caller's thread; serialization
+    and the atomic rename happen in the background. At most one write is
+    queued behind the one in progress, bounding memory to two snapshots.
+    After each write only the newest `keep_last` checkpoints are kept
+    (0 keeps all).
+    """
+
+    def __init__(self, save_dir, keep_last=0):
+        self.save_dir = save_dir
+        self.keep_last = keep_last
+        self.error = None
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, state, path):
+        if self.error is not None:
+            raise RuntimeError("previous checkpoint write failed") from self.error
+        self._queue.put((state, path))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                state, path = item
+                write_atomic(state, path)
+                self._prune()
+            except Exception as e:
+                self.error = e
+            finally:
+                self._queue.task_done()
+
+    def _prune(self):
+        if self.keep_last <= 0:
+            return
+        for old in list_checkpoints(self.save_dir)[:-self.keep_last]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+    def wait(self):
+        """Block until every queued checkpoint has been written."""
+        self._queue.join()
+        if self.error is not None:
+            raise RuntimeError("checkpoint write failed") from self.error
+
+    def close(self):
+        self.wait()
+        self._queue.put(None)
+        self._thread.join()
@@ -1,5 +1,6 @@
+import os
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, IterableDataset, get_worker_info
 
 
 class SyntheticSeqDataset(Dataset):
@@ -23,3 +24,273 @@ class SyntheticSeqDataset(Dataset):
         target = torch.roll(seq, -1)
         target[-1] = 0
         return seq, target
+
+
+def _shift_targets(seq):
+    """Next-token targets for a (batch, seq_len) tensor; last position is 0 (ignored)."""
+    target = torch.zeros_like(seq)
+    target[:, :-1] = seq[:, 1:]
+    return target
+
+
+def _as_index_list(idx):
+    if isinstance(idx, int):
+        return None
+    return list(idx)
+
+
+_MASK31 = 0x7FFFFFFF
+
+
+def _mix(x):
+    """Integer hash of int64 values in [0, 2**31); products stay below 2**63."""
+    for _ in range(3):
+        x = ((x ^ (x >> 16)) * 0x45D9F3B) & _MASK31
+    return x ^ (x >> 16)
+
+
+class SyntheticBatchDataset(Dataset):
+    """Vectorized synthetic source indexed by whole batches.
+
+    With `materialize=True` every sample is generated up front in one
+    `torch.randint` call; otherwise each batch is generated on demand by
+    hashing `(seed, index, position)`, so `ds[i]` is the same whichever batch,
+    epoch or worker it is fetched in. Indexing with a list of indices
+    returns a stacked (batch, seq_len) pair, which lets `make_loader` skip
+    per-item collation.
+    """
+
+    def __init__(self, num_samples=1024, seq_len=32, vocab_size=1000, seed=0, materialize=True):
+        self.num_samples = num_samples
+        self.seq_len = seq_len
+        self.vocab_size = vocab_size
+        self.seed = seed
+        self.data = None
+        if materialize:
+            gen = torch.Generator().manual_seed(seed)
+            self.data = torch.randint(1, vocab_size, (num_samples, seq_len), dtype=torch.long, generator=gen)
+
+    def __len__(self):
+        return self.num_samples
+
+    def _generate(self, indices):
+        idx = torch.as_tensor(indices, dtype=torch.long).unsqueeze(1)
+        pos = torch.arange(self.seq_len, dtype=torch.long).unsqueeze(0)
+        h = _mix(_mix(_mix(torch.tensor(self.seed & _MASK31)) ^ (idx & _MASK31)) ^ pos)
+        return 1 + h % (self.vocab_size - 1)
+
+    def __getitem__(self, idx):
+        indices = _as_index_list(idx)
+        if indices is None:
+            x, y = self[[idx]]
+            return x[0], y[0]
+        seq = self.data[indices] if self.data is not None else self._generate(indices)
+        return seq, _shift_targets(seq)
+
+
+class MemmapTokenDataset(Dataset):
+    """Next-token windows over flat binary token shards (`.bin` files).
+
+    Each shard is a headerless array of `dtype` (uint16 or uint32) token ids
+    opened with `np.memmap`, so only the pages actually read are loaded. Shards
+    are cut into non-overlapping windows of `seq_len + 1` tokens; a single
+    index returns zero-copy views of the shard converted to long tensors.
+    """
+
+    def __init__(self, paths, seq_len=32, dtype="uint16"):
+        import glob
+        import numpy as np
+
+        if isinstance(paths, (str, os.PathLike)):
+            p = os.fspath(paths)
+            if os.path.isdir(p):
+                paths = sorted(glob.glob(os.path.join(p, "*.bin")))
+            else:
+                paths = sorted(glob.glob(p)) or [p]
+        self.paths = [os.fspath(p) for p in paths]
+        if not self.paths:
+            raise FileNotFoundError("no token shards found")
+        self.seq_len = seq_len
+        self.dtype = np.dtype(dtype)
+        # mode "c" (copy-on-write) keeps the mapping zero-copy but writable, which
+        # torch.from_numpy requires
+        self.shards = [np.memmap(p, dtype=self.dtype, mode="c") for p in self.paths]
+        self._counts = [max(0, (len(s) - 1) // seq_len) for s in self.shards]
+        self._offsets = np.cumsum([0] + self._counts)
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def _window(self, i):
+        import numpy as np
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        shard = int(np.searchsorted(self._offsets, i, side="right") - 1)
+        start = (i - int(self._offsets[shard])) * self.seq_len
+        return torch.from_numpy(self.shards[shard][start:start + self.seq_len + 1])
+
+    def __getitem__(self, idx):
+        indices = _as_index_list(idx)
+        if indices is None:
+            window = self._window(idx).long()
+            return window[:-1], window[1:]
+        windows = torch.stack([self._window(i) for i in indices]).long()
+        return windows[:, :-1].contiguous(), windows[:, 1:].contiguous()
+
+
+def write_token_shard(path, tokens, dtype="uint16"):
+    """Write token ids as a flat binary shard readable by `MemmapTokenDataset`."""
+    import numpy as np
+
+    arr = np.asarray(tokens, dtype=dtype)
+    arr.tofile(path)
+    return len(arr)
+
+
+def make_loader(ds, batch_size, shuffle=False, num_workers=0, pin_memory=False, drop_last=False, sampler=None):
+    """Build a DataLoader for the datasets above.
+
+    Batch-indexable datasets receive a whole list of indices per fetch (via a
+    `BatchSampler`) so samples are produced already stacked; others fall back
+    to the default per-item collation. `sampler` (e.g. a `DistributedSampler`)
+    replaces the default random/sequential sampler.
+    """
+    from torch.utils.data import BatchSampler, DataLoader, RandomSampler, SequentialSampler
+
+    kwargs = {
+        "num_workers": num_workers,
+        "pin_memory": pin_memory,
+        # iterable datasets are copied into each worker, so persistent workers
+        # would never see set_epoch()
+        "persistent_workers": num_workers > 0 and not isinstance(ds, IterableDataset),
+    }
+    if isinstance(getattr(ds, "dataset", ds), (SyntheticBatchDataset, MemmapTokenDataset)):
+        if sampler is None:
+            sampler = RandomSampler(ds) if shuffle else SequentialSampler(ds)
+        batches = BatchSampler(sampler, batch_size=batch_size, drop_last=drop_last)
+        return DataLoader(ds, sampler=batches, batch_size=None, **kwargs)
+    if isinstance(ds, IterableDataset):
+        # iterable datasets shuffle and shard themselves; packed windows are
+        # dealt to workers in whole batches so len(loader) stays exact
+        if isinstance(ds, PackedTokenDataset):
+            ds.batch_size = batch_size
+        return DataLoader(ds, batch_size=batch_size, drop_last=drop_last, **kwargs)
+    if sampler is not None:
+        return DataLoader(ds, batch_size=batch_size, sampler=sampler, drop_last=drop_last, **kwargs)
+    return DataLoader(ds, batch_size=batch_size, shuffle=shuffle, drop_last=drop_last, **kwargs)
+
+
+class PackedTokenDataset(IterableDataset):
+    """Packs documents back-to-back into full `seq_len` windows.
+
+    Shards (written by `train/prepare_reports.py`) hold documents separated by
+    `eos_id`; they are treated as one continuous stream and cut into windows
+    of `seq_len + 1` tokens, so only the final window is ever padded. Each
+    item is `(x, y, segment_ids)`: `segment_ids` numbers the documents inside
+    the window so the model can keep attention within a document, and targets
+    that would predict the first token of the next document are set to 0
+    (ignored by the loss).
+
+    Windows are shuffled per epoch (seeded by `seed` and `set_epoch`, as with
+    `DistributedSampler`) and split across distributed ranks and DataLoader
+    workers. Like `DistributedSampler`, the order wraps around so every rank
+    gets the same number of windows, keeping DDP collectives in step.
+    DataLoader workers take turns on runs of `batch_size` windows (set by
+    `make_loader`), so every batch is full except the rank's last one.
+    `windows` restricts the dataset to a range of window indices, e.g. for a
+    validation split.
+    """
+
+    def __init__(self, paths, seq_len=32, eos_id=257, dtype="uint16", shuffle=True, seed=0, windows=None):
+        super().__init__()
+        self.tokens = MemmapTokenDataset(paths, seq_len=seq_len, dtype=dtype)
+        self.seq_len = seq_len
+        self.eos_id = eos_id
+        self.shuffle = shuffle
+        self.seed = seed
+        self._lengths = [len(s) for s in self.tokens.shards]
+        self._starts = [0]
+        for n in self._lengths:
+            self._starts.append(self._starts[-1] + n)
+        self.total_tokens = self._starts[-1]
+        # a window needs at least one target, so the last token never starts one
+        n_windows = max(0, -(-(self.total_tokens - 1) // seq_len))
+        self.windows = range(n_windows) if windows is None else windows
+        self.epoch = 0
+        self.batch_size = 1
+
+    def set_epoch(self, epoch):
+        """Reshuffle for `epoch`; call before iterating, as with `DistributedSampler`."""
+        self.epoch = epoch
+
+    def __len__(self):
+        # windows seen by this rank (equal on every rank); workers split them further
+        _, world = self._rank_info()
+        return -(-len(self.windows) // world)
+
+    def _slice(self, start, end):
+        import numpy as np
+
+        parts = []
+        for shard, s0, n in zip(self.tokens.shards, self._starts, self._lengths):
+            lo, hi = max(start, s0), min(end, s0 + n)
+            if lo < hi:
+                parts.append(shard[lo - s0:hi - s0])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def window(self, k):
+        start = k * self.seq_len
+        chunk = torch.from_numpy(self._slice(start, start + self.seq_len + 1)).long()
+        if len(chunk) < self.seq_len + 1:
+            chunk = torch.cat([chunk, chunk.new_zeros(self.seq_len + 1 - len(chunk))])
+        x, y = chunk[:-1], chunk[1:].clone()
+        is_eos = x == self.eos_id
+        y[is_eos] = 0
+        segment_ids = torch.cumsum(is_eos.long(), 0) - is_eos.long()
+        return x, y, segment_ids
+
+    @staticmethod
+    def _rank_info():
+        import torch.distributed as dist
+
+        if dist.is_available() and dist.is_initialized():
+            return dist.get_rank(), dist.get_world_size()
+        return 0, 1
+
+    def __iter__(self):
+        n = len(self.windows)
+        if n == 0:
+            return
+        order = torch.arange(n)
+        if self.shuffle:
+            gen = torch.Generator().manual_seed(self.seed + self.epoch)
+            order = order[torch.randperm(n, generator=gen)]
+        rank, world = self._rank_info()
+        per_rank = len(self)
+        # wrap around so the order divides evenly across ranks
+        order = order.repeat(-(-per_rank * world // n))[:per_rank * world]
+        order = order[rank::world]
+        info = get_worker_info()
+        if info is not None:
+            chunks = order.split(self.batch_size)
+            order = torch.cat(chunks[info.id::info.num_workers] or [order[:0]])
+        for i in order.tolist():
+            yield self.window(self.windows[i])
+
+    def stats(self):
+        """Packing efficiency: share of input positions holding real tokens."""
+        capacity = len(self.windows) * self.seq_len  # across all ranks
+        padding = 0
+        if len(self.windows):
+            # only the window at the very end of the stream can be short
+            tail = self.total_tokens - self.windows[-1] * self.seq_len
+            padding = self.seq_len - min(self.seq_len, tail)
+        return {
+            "windows": len(self.windows),
+            "tokens": capacity - padding,
+            "padding": padding,
+            "efficiency": (capacity - padding) / capacity if capacity else 0.0,
+        }
@@ -0,0 +1,72 @@
+import argparse
+import os
+import sys
+import time
+import torch
+# Ensure local imports work when running script directly
+sys.path.append(os.path.dirname(__file__))
+from model import TinyTransformerLM
+from checkpoint import load_checkpoint
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--checkpoint", type=str, default=None, help="Checkpoint saved by train.py; random init if omitted")
+    p.add_argument("--vocab-size", type=int, default=1000)
+    p.add_argument("--max-len", type=int, default=512)
+    p.add_argument("--prompt", type=str, default="1 2 3", help="Space-separated token ids; use ';' to separate prompts")
+    p.add_argument("--max-new-tokens", type=int, default=32)
+    p.add_argument("--temperature", type=float, default=1.0)
+    p.add_argument("--top-k", type=int, default=None)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--benchmark", action="store_true", help="Compare cached vs uncached decoding time and exit")
+    return p.parse_args(argv)
+
+
+def load_model(cfg):
+    if not cfg.checkpoint:
+        return TinyTransformerLM(vocab_size=cfg.vocab_size, max_len=cfg.max_len).eval()
+    state = load_checkpoint(cfg.checkpoint)
+    model = TinyTransformerLM(**state.get("config") or {"vocab_size": cfg.vocab_size, "max_len": cfg.max_len})
+    model.load_state_dict(state["model"])
+    return model.eval()
+
+
+def benchmark(model, lengths=(32, 64, 128, 256, 448), batch_size=4):
+    """Time greedy decoding with and without the KV cache.
+
+    Cached decoding does one single-token forward per new token, so its time
+    grows linearly with the number of tokens; the uncached path re-encodes the
+    whole prefix every step and grows quadratically.
+    """
+    prompt = torch.randint(1, model.head.out_features, (batch_size, 16))
+    results = []
+    for n in lengths:
+        n = min(n, model.max_len - prompt.size(1))
+        row = [n]
+        for use_cache in (True, False):
+            model.generate(prompt, 4, temperature=0, use_cache=use_cache)  # warm-up
+            t0 = time.perf_counter()
+            model.generate(prompt, n, temperature=0, use_cache=use_cache)
+            row.append(time.perf_counter() - t0)
+        results.append(row)
+        print(f"new_tokens={n:4d}  cached={row[1]*1000:8.1f} ms ({row[1]/n*1000:6.2f} ms/tok)  "
+              f"uncached={row[2]*1000:8.1f} ms ({row[2]/n*1000:6.2f} ms/tok)")
+    return results
+
+
+def main(cfg):
+    torch.manual_seed(cfg.seed)
+    model = load_model(cfg)
+    if cfg.benchmark:
+        benchmark(model)
+        return
+    prompts = [[int(t) for t in p.split()] for p in cfg.prompt.split(";")]
+    gen = torch.Generator().manual_seed(cfg.seed)
+    out = model.generate(prompts, cfg.max_new_tokens, temperature=cfg.temperature, top_k=cfg.top_k, generator=gen)
+    for p, row in zip(prompts, out.tolist()):
+        print(" ".join(map(str, p + row)))
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,26 +1,194 @@
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
+
+
+class KVCache:
+    """Preallocated key/value buffers for one attention layer.
+
+    Shapes are (batch, nhead, max_len, head_dim); `append` writes new keys and
+    values in place and returns views over everything cached so far.
+    """
+
+    def __init__(self, batch, nhead, max_len, head_dim, device=None, dtype=None):
+        self.k = torch.zeros(batch, nhead, max_len, head_dim, device=device, dtype=dtype)
+        self.v = torch.zeros_like(self.k)
+        self.length = 0
+
+    def append(self, k, v):
+        end = self.length + k.size(2)
+        if end > self.k.size(2):
+            raise ValueError(f"KV cache overflow: {end} > {self.k.size(2)}")
+        self.k[:, :, self.length:end] = k
+        self.v[:, :, self.length:end] = v
+        self.length = end
+        return self.k[:, :, :end], self.v[:, :, :end]
+
+
+class CausalSelfAttention(nn.Module):
+    def __init__(self, d_model, nhead, dropout=0.1):
+        super().__init__()
+        if d_model % nhead:
+            raise ValueError("d_model must be divisible by nhead")
+        self.nhead = nhead
+        self.head_dim = d_model // nhead
+        self.dropout = dropout
+        self.qkv = nn.Linear(d_model, 3 * d_model)
+        self.proj = nn.Linear(d_model, d_model)
+
+    def forward(self, x, mask=None, cache=None):
+        # x: (batch, seq_len, d_model); mask: bool (batch, 1, seq_len, kv_len), True = attend
+        b, s, d = x.shape
+        q, k, v = self.qkv(x).split(d, dim=2)
+        q, k, v = (t.view(b, s, self.nhead, self.head_dim).transpose(1, 2) for t in (q, k, v))
+        if cache is not None:
+            k, v = cache.append(k, v)
+        y = F.scaled_dot_product_attention(
+            q, k, v,
+            attn_mask=mask,
+            dropout_p=self.dropout if self.training else 0.0,
+            is_causal=mask is None,
+        )
+        return self.proj(y.transpose(1, 2).reshape(b, s, d))
+
+
+class Block(nn.Module):
+    """Pre-norm transformer decoder block."""
+
+    def __init__(self, d_model, nhead, dim_feedforward, dropout):
+        super().__init__()
+        self.ln1 = nn.LayerNorm(d_model)
+        self.attn = CausalSelfAttention(d_model, nhead, dropout)
+        self.ln2 = nn.LayerNorm(d_model)
+        self.mlp = nn.Sequential(
+            nn.Linear(d_model, dim_feedforward),
+            nn.GELU(),
+            nn.Linear(dim_feedforward, d_model),
+        )
+        self.drop = nn.Dropout(dropout)
+
+    def forward(self, x, mask=None, cache=None):
+        x = x + self.drop(self.attn(self.ln1(x), mask, cache))
+        x = x + self.drop(self.mlp(self.ln2(x)))
+        return x
 
 
 class TinyTransformerLM(nn.Module):
+    """Causal, batch-first language model with KV-cached generation."""
+
     def __init__(self, vocab_size=1000, d_model=128, nhead=4, num_layers=2, dim_feedforward=256, dropout=0.1, max_len=512):
         super().__init__()
+        # constructor arguments, stored in checkpoints so models can be rebuilt
+        self.config = dict(vocab_size=vocab_size, d_model=d_model, nhead=nhead, num_layers=num_layers,
+                           dim_feedforward=dim_feedforward, dropout=dropout, max_len=max_len)
+        self.nhead = nhead
+        self.max_len = max_len
         self.token_emb = nn.Embedding(vocab_size, d_model, padding_idx=0)
         self.pos_emb = nn.Embedding(max_len, d_model)
-        encoder_layer = nn.TransformerEncoderLayer(d_model=d_model, nhead=nhead, dim_feedforward=dim_feedforward, dropout=dropout)
-        self.transformer = nn.TransformerEncoder(encoder_layer, num_layers=num_layers)
+        self.blocks = nn.ModuleList(Block(d_model, nhead, dim_feedforward, dropout) for _ in range(num_layers))
         self.ln = nn.LayerNorm(d_model)
         self.head = nn.Linear(d_model, vocab_size)
 
-    def forward(self, x):
-        # x: (batch, seq_len)
+    def new_cache(self, batch, max_len=None):
+        """One `KVCache` per layer, sized for `max_len` total positions."""
+        p = self.pos_emb.weight
+        head_dim = p.size(1) // self.nhead
+        return [KVCache(batch, self.nhead, max_len or self.max_len, head_dim, p.device, p.dtype) for _ in self.blocks]
+
+    def forward(self, x, attention_mask=None, caches=None, segment_ids=None):
+        """Return logits (batch, seq_len, vocab).
+
+        `attention_mask` (batch, past + seq_len) marks real tokens with 1 and
+        left padding with 0. `caches` (from `new_cache`) are extended in place;
+        `x` then holds only the new tokens. `segment_ids` (batch, seq_len)
+        numbers packed documents: attention stays within a document and
+        positions restart at each document (not supported with `caches`).
+        """
         b, s = x.shape
-        pos = torch.arange(s, device=x.device).unsqueeze(0).expand(b, s)
-        x = self.token_emb(x) + self.pos_emb(pos)
-        # transformer expects (seq_len, batch, d_model)
-        x = x.transpose(0, 1)
-        x = self.transformer(x)  # (seq_len, batch, d_model)
-        x = x.transpose(0, 1)  # (batch, seq_len, d_model)
-        x = self.ln(x)
-        logits = self.head(x)
-        return logits
+        past = caches[0].length if caches else 0
+        mask = None
+        if segment_ids is not None:
+            idx = torch.arange(s, device=x.device).expand(b, s)
+            first = torch.ones_like(segment_ids, dtype=torch.bool)
+            first[:, 1:] = segment_ids[:, 1:] != segment_ids[:, :-1]
+            pos = idx - torch.cummax(torch.where(first, idx, 0), dim=1).values
+            same_doc = segment_ids[:, None, :, None] == segment_ids[:, None, None, :]
+            mask = same_doc & torch.ones(s, s, dtype=torch.bool, device=x.device).tril()
+        elif attention_mask is None:
+            pos = torch.arange(past, past + s, device=x.device).unsqueeze(0).expand(b, s)
+            if past:
+                attention_mask = torch.ones(b, past + s, dtype=torch.long, device=x.device)
+        else:
+            pos = (attention_mask.long().cumsum(-1) - 1).clamp(min=0)[:, past:]
+        if attention_mask is not None and segment_ids is None:
+            q_idx = torch.arange(past, past + s, device=x.device).unsqueeze(1)
+            k_idx = torch.arange(past + s, device=x.device).unsqueeze(0)
+            # causal & not padding; each query may always see itself so padded
+            # rows are never fully masked (which would yield NaNs)
+            mask = (k_idx <= q_idx) & attention_mask.bool()[:, None, None, :]
+            mask = mask | (k_idx == q_idx)
+        h = self.token_emb(x) + self.pos_emb(pos)
+        for i, block in enumerate(self.blocks):
+            h = block(h, mask, caches[i] if caches else None)
+        h = self.ln(h)
+        return self.head(h)
+
+    @staticmethod
+    def _sample(logits, temperature, top_k, generator):
+        if temperature <= 0:
+            return logits.argmax(-1, keepdim=True)
+        logits = logits.float() / temperature
+        if top_k is not None:
+            kth = torch.topk(logits, min(top_k, logits.size(-1)), dim=-1).values[:, -1:]
+            logits = logits.masked_fill(logits < kth, float("-inf"))
+        return torch.multinomial(F.softmax(logits, dim=-1), 1, generator=generator)
+
+    @torch.no_grad()
+    def generate(self, prompts, max_new_tokens, temperature=1.0, top_k=None, use_cache=True, generator=None,
+                 eos_id=None):
+        """Sample `max_new_tokens` continuations for a batch of prompts.
+
+        `prompts` is a (batch, seq_len) LongTensor or a list of token id lists of
+        different lengths (left-padded with 0). `temperature=0` is greedy.
+        Returns a (batch, max_new_tokens) LongTensor. With `eos_id`, a row is
+        padded with 0 after it samples `eos_id`, and sampling stops early (with
+        fewer columns) once every row has.
+        """
+        device = self.pos_emb.weight.device
+        if isinstance(prompts, torch.Tensor):
+            ids = prompts.to(device)
+            mask = torch.ones_like(ids)
+        else:
+            width = max(len(p) for p in prompts)
+            ids = torch.zeros(len(prompts), width, dtype=torch.long, device=device)
+            mask = torch.zeros_like(ids)
+            for i, p in enumerate(prompts):
+                if len(p):
+                    ids[i, width - len(p):] = torch.as_tensor(p, dtype=torch.long)
+                    mask[i, width - len(p):] = 1
+        b, s = ids.shape
+        if s + max_new_tokens > self.max_len:
+            raise ValueError(f"prompt + max_new_tokens exceeds max_len={self.max_len}")
+
+        was_training = self.training
+        self.eval()
+        caches = self.new_cache(b, s + max_new_tokens) if use_cache else None
+        logits = self(ids, attention_mask=mask, caches=caches)[:, -1]
+        out = []
+        done = torch.zeros(b, 1, dtype=torch.bool, device=device)
+        for step in range(max_new_tokens):
+            nxt = self._sample(logits, temperature, top_k, generator)
+            if eos_id is not None:
+                nxt = nxt.masked_fill(done, 0)
+                done = done | (nxt == eos_id)
+            out.append(nxt)
+            if step + 1 == max_new_tokens or (eos_id is not None and bool(done.all())):
+                break
+            mask = torch.cat([mask, torch.ones_like(nxt)], dim=1)
+            if use_cache:
+                logits = self(nxt, attention_mask=mask, caches=caches)[:, -1]
+            else:
+                ids = torch.cat([ids, nxt], dim=1)
+                logits = self(ids, attention_mask=mask)[:, -1]
+        self.train(was_training)
+        return torch.cat(out, dim=1) if out else ids.new_zeros(b, 0)
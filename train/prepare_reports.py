@@ -0,0 +1,84 @@
+"""Build a packed-training corpus from saved research reports.
+
+Streams reports out of `storage`, trains a byte-level BPE tokenizer on them,
+and writes documents separated by the end-of-document id into flat token
+shards. Train on the result with:
+
+    python train/train.py --data <out> --packed --vocab-size <vocab> --token-dtype <dtype>
+"""
+import argparse
+import json
+import os
+import sys
+import numpy as np
+# Ensure local imports work when running script directly
+sys.path.append(os.path.dirname(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset import PackedTokenDataset
+from tokenizer import EOS_ID, ByteBPETokenizer
+import storage
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--runs", type=str, default=None, help="runs.json to read (default: storage.RUNS_PATH)")
+    p.add_argument("--out", type=str, default="data/reports")
+    p.add_argument("--vocab-size", type=int, default=2048)
+    p.add_argument("--tokenizer", type=str, default=None, help="Reuse an existing tokenizer.json instead of training one")
+    p.add_argument("--shard-tokens", type=int, default=1 << 20, help="Tokens per .bin shard")
+    p.add_argument("--seq-len", type=int, default=128, help="Window length used to report packing efficiency")
+    return p.parse_args(argv)
+
+
+def write_shards(docs, out_dir, shard_tokens, dtype):
+    """Append token documents to consecutive shards of about `shard_tokens` ids."""
+    paths, buf, lengths = [], [], []
+
+    def flush():
+        path = os.path.join(out_dir, f"shard_{len(paths):05d}.bin")
+        np.asarray(buf, dtype=dtype).tofile(path)
+        paths.append(path)
+        buf.clear()
+
+    for ids in docs:
+        buf.extend(ids)
+        lengths.append(len(ids))
+        if len(buf) >= shard_tokens:
+            flush()
+    if buf:
+        flush()
+    return paths, lengths
+
+
+def prepare(cfg):
+    os.makedirs(cfg.out, exist_ok=True)
+    def reports():
+        return (report for _, report in storage.iter_reports(cfg.runs))
+
+    if cfg.tokenizer:
+        tok = ByteBPETokenizer.load(cfg.tokenizer)
+    else:
+        tok = ByteBPETokenizer.train(reports(), cfg.vocab_size)
+    tok.save(os.path.join(cfg.out, "tokenizer.json"))
+    dtype = "uint16" if tok.vocab_size <= 1 << 16 else "uint32"
+    paths, lengths = write_shards((tok.encode_document(r) for r in reports()), cfg.out, cfg.shard_tokens, dtype)
+    n_docs, n_tokens = len(lengths), sum(lengths)
+    meta = {"vocab_size": tok.vocab_size, "eos_id": EOS_ID, "dtype": dtype, "tokenizer": "tokenizer.json",
+            "documents": n_docs, "tokens": n_tokens, "shards": [os.path.basename(p) for p in paths]}
+    print(f"Wrote {n_docs} documents / {n_tokens} tokens to {len(paths)} shard(s) in {cfg.out} "
+          f"(vocab={tok.vocab_size}, dtype={dtype})")
+    if paths:
+        stats = PackedTokenDataset(cfg.out, seq_len=cfg.seq_len, eos_id=EOS_ID, dtype=dtype).stats()
+        # baseline: every document padded up to a whole number of windows
+        padded = sum(-(-n // cfg.seq_len) * cfg.seq_len for n in lengths)
+        meta["packing_efficiency"] = stats["efficiency"]
+        print(f"Packing efficiency at seq_len={cfg.seq_len}: {stats['efficiency']:.2%} "
+              f"({stats['padding']} padding positions in {stats['windows']} windows); "
+              f"one document per padded window would be {n_tokens / padded:.2%}")
+    with open(os.path.join(cfg.out, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+if __name__ == "__main__":
+    prepare(parse_args())
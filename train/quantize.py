@@ -0,0 +1,153 @@
+import argparse
+import math
+import os
+import sys
+import time
+import torch
+import torch.nn as nn
+# Ensure local imports work when running script directly
+sys.path.append(os.path.dirname(__file__))
+from checkpoint import load_checkpoint, write_atomic
+from dataset import MemmapTokenDataset, SyntheticBatchDataset, make_loader
+from model import TinyTransformerLM
+
+QUANT_SCHEME = "int8_dynamic"
+
+
+def quantize(model):
+    """Dynamic int8 quantization of every nn.Linear (attention, MLP and `head`).
+
+    Weights are stored as int8; activations are quantized on the fly, so no
+    calibration data is needed. Embeddings and LayerNorms stay fp32.
+    """
+    from torch.ao.quantization import quantize_dynamic
+
+    return quantize_dynamic(model.eval(), {nn.Linear}, dtype=torch.qint8)
+
+
+def save_quantized(qmodel, config, path, tokenizer=None):
+    state = {"config": dict(config), "quantized": QUANT_SCHEME, "model": qmodel.state_dict()}
+    if tokenizer is not None:
+        state["tokenizer"] = tokenizer
+    write_atomic(state, path)
+
+
+def load_model(path):
+    """Load a fp32 or quantized checkpoint written by train.py or this script."""
+    state = load_checkpoint(path)
+    model = TinyTransformerLM(**state.get("config", {}))
+    if state.get("quantized") == QUANT_SCHEME:
+        model = quantize(model)
+    model.load_state_dict(state["model"])
+    return model.eval()
+
+
+@torch.no_grad()
+def perplexity(model, loader):
+    """exp(mean next-token cross-entropy) over non-padding targets."""
+    loss_fn = nn.CrossEntropyLoss(ignore_index=0, reduction="sum")
+    total, count = 0.0, 0
+    for x, y in loader:
+        logits = model(x)
+        total += loss_fn(logits.reshape(-1, logits.size(-1)).float(), y.reshape(-1)).item()
+        count += int((y != 0).sum())
+    return math.exp(total / max(1, count))
+
+
+def export(cfg):
+    """Quantize a checkpoint, check perplexity drift on held-out data and save it."""
+    model = load_model(cfg.checkpoint)
+    seq_len = min(cfg.seq_len, model.max_len)
+    if cfg.data:
+        val_ds = MemmapTokenDataset(cfg.data, seq_len=seq_len, dtype=cfg.token_dtype)
+    else:
+        val_ds = SyntheticBatchDataset(num_samples=64, seq_len=seq_len, vocab_size=model.head.out_features, seed=1)
+    loader = make_loader(val_ds, cfg.batch_size)
+    ppl_fp32 = perplexity(model, loader)
+    qmodel = quantize(model)
+    ppl_int8 = perplexity(qmodel, loader)
+    drift = abs(ppl_int8 - ppl_fp32) / ppl_fp32
+    print(f"perplexity fp32={ppl_fp32:.3f} int8={ppl_int8:.3f} drift={drift:.2%} (tolerance {cfg.tolerance:.2%})")
+    if drift > cfg.tolerance:
+        raise SystemExit(f"perplexity drift {drift:.2%} exceeds tolerance; not saving {cfg.out}")
+    # carry the embedded tokenizer (if any) over from the fp32 checkpoint
+    save_quantized(qmodel, model.config, cfg.out, load_checkpoint(cfg.checkpoint).get("tokenizer"))
+    print(f"Saved quantized checkpoint: {cfg.out}")
+    return ppl_fp32, ppl_int8
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _bench_variant(variant, checkpoint, shapes, iters, results):
+    torch.manual_seed(0)
+    base_rss = _rss_mb()
+    model = load_model(checkpoint) if checkpoint else TinyTransformerLM(max_len=512).eval()
+    if variant == "bf16":
+        model = model.to(torch.bfloat16)
+    elif variant == "int8":
+        model = quantize(model)
+    vocab = model.head.out_features
+    rows = []
+    with torch.no_grad():
+        for batch, seq in shapes:
+            seq = min(seq, model.max_len)
+            x = torch.randint(1, vocab, (batch, seq))
+            model(x)  # warm-up
+            t0 = time.perf_counter()
+            for _ in range(iters):
+                model(x)
+            elapsed = (time.perf_counter() - t0) / iters
+            rows.append((variant, batch, seq, 1000 * elapsed, batch * seq / elapsed, _rss_mb() - base_rss))
+    results.put(rows)
+
+
+def benchmark(cfg, shapes=((1, 32), (8, 32), (8, 128), (32, 128)), iters=10):
+    """Forward latency, tokens/sec and resident memory for fp32, bf16 and int8.
+
+    Each variant runs in a fresh process so resident memory is not shared
+    between them; memory is reported relative to the process baseline.
+    """
+    import torch.multiprocessing as mp
+
+    ctx = mp.get_context("spawn")
+    rows = []
+    for variant in ("fp32", "bf16", "int8"):
+        results = ctx.SimpleQueue()
+        p = ctx.Process(target=_bench_variant, args=(variant, cfg.checkpoint, shapes, iters, results))
+        p.start()
+        rows.extend(results.get())
+        p.join()
+    print(f"{'dtype':5s} {'batch':>5s} {'seq':>5s} {'latency ms':>11s} {'tok/s':>10s} {'rss MB':>8s}")
+    for variant, batch, seq, ms, tok_s, rss in rows:
+        print(f"{variant:5s} {batch:5d} {seq:5d} {ms:11.2f} {tok_s:10.0f} {rss:8.1f}")
+    return rows
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser()
+    p.add_argument("--checkpoint", type=str, default=None, help="fp32 checkpoint from train.py")
+    p.add_argument("--out", type=str, default=None, help="Where to write the int8 checkpoint")
+    p.add_argument("--data", type=str, default=None, help="Held-out token shard(s); synthetic data if omitted")
+    p.add_argument("--token-dtype", type=str, default="uint16", choices=["uint16", "uint32"])
+    p.add_argument("--seq-len", type=int, default=512)
+    p.add_argument("--batch-size", type=int, default=8)
+    p.add_argument("--tolerance", type=float, default=0.05, help="Maximum relative perplexity drift")
+    p.add_argument("--benchmark", action="store_true", help="Compare fp32/bf16/int8 CPU inference and exit")
+    return p.parse_args(argv)
+
+
+if __name__ == "__main__":
+    cfg = parse_args()
+    if cfg.benchmark:
+        benchmark(cfg)
+    else:
+        if not cfg.checkpoint or not cfg.out:
+            raise SystemExit("--checkpoint and --out are required to export")
+        export(cfg)
@@ -0,0 +1,118 @@
+import json
+import re
+from collections import Counter
+
+PAD_ID = 0
+EOS_ID = 257
+BYTE_OFFSET = 1  # byte b has id b + 1, as in local_llm.ByteTokenizer (which knows no merges)
+FIRST_MERGE_ID = 258
+
+# words keep their leading space so merges never span word boundaries
+PRETOKENIZE = re.compile(r"\s?\w+|\s?[^\w\s]+|\s+")
+
+
+def _merge(word, pair, new_id):
+    out = []
+    i = 0
+    while i < len(word):
+        if i + 1 < len(word) and word[i] == pair[0] and word[i + 1] == pair[1]:
+            out.append(new_id)
+            i += 2
+        else:
+            out.append(word[i])
+            i += 1
+    return tuple(out)
+
+
+class ByteBPETokenizer:
+    """Byte-level BPE: 0 is padding, 1-256 are raw bytes, 257 ends a document.
+
+    Learned merges get ids from 258 upwards in the order they were learned,
+    so any UTF-8 text can be encoded and decoding is lossless.
+    """
+
+    eos_id = EOS_ID
+
+    def __init__(self, merges=()):
+        self.merges = {tuple(pair): FIRST_MERGE_ID + i for i, pair in enumerate(merges)}
+        self.vocab = {b + BYTE_OFFSET: bytes([b]) for b in range(256)}
+        for (a, b), new_id in self.merges.items():
+            self.vocab[new_id] = self.vocab[a] + self.vocab[b]
+        self._cache = {}
+
+    @property
+    def vocab_size(self):
+        return FIRST_MERGE_ID + len(self.merges)
+
+    @classmethod
+    def train(cls, texts, vocab_size):
+        """Learn merges from an iterable of texts until `vocab_size` ids exist."""
+        counts = Counter()
+        for text in texts:
+            counts.update(PRETOKENIZE.findall(text))
+        words = Counter()
+        for w, c in counts.items():
+            words[tuple(b + BYTE_OFFSET for b in w.encode("utf-8"))] += c
+        merges = []
+        while FIRST_MERGE_ID + len(merges) < vocab_size:
+            pairs = Counter()
+            for w, c in words.items():
+                for pair in zip(w, w[1:]):
+                    pairs[pair] += c
+            if not pairs:
+                break
+            # highest count wins; ties go to the smallest pair for determinism
+            best, freq = min(pairs.items(), key=lambda kv: (-kv[1], kv[0]))
+            if freq < 2:
+                break
+            new_id = FIRST_MERGE_ID + len(merges)
+            merges.append(best)
+            merged = Counter()
+            for w, c in words.items():
+                merged[_merge(w, best, new_id) if len(w) > 1 else w] += c
+            words = merged
+        return cls(merges)
+
+    def _encode_word(self, word):
+        ids = self._cache.get(word)
+        if ids is not None:
+            return ids
+        ids = tuple(b + BYTE_OFFSET for b in word.encode("utf-8"))
+        while len(ids) > 1:
+            ranked = [(self.merges[p], p) for p in zip(ids, ids[1:]) if p in self.merges]
+            if not ranked:
+                break
+            new_id, pair = min(ranked)
+            ids = _merge(ids, pair, new_id)
+        self._cache[word] = ids
+        return ids
+
+    def encode(self, text):
+        out = []
+        for word in PRETOKENIZE.findall(text):
+            out.extend(self._encode_word(word))
+        return out
+
+    def encode_document(self, text):
+        """Token ids for `text` followed by the end-of-document id."""
+        return self.encode(text) + [EOS_ID]
+
+    def decode(self, ids):
+        return b"".join(self.vocab.get(i, b"") for i in ids).decode("utf-8", errors="replace")
+
+    def state_dict(self):
+        """Plain lists and ints, so it can be embedded in checkpoints."""
+        return {"version": 1, "merges": [list(p) for p in self.merges]}
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["merges"])
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.state_dict(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_state(json.load(f))
@@ -1,15 +1,23 @@
 import argparse
+import contextlib
+import json
 import os
 import sys
+import time
 import torch
-from torch.utils.data import DataLoader
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import Subset
+from torch.utils.data.distributed import DistributedSampler
 # Ensure local imports work when running script directly
 sys.path.append(os.path.dirname(__file__))
-from dataset import SyntheticSeqDataset
+from dataset import MemmapTokenDataset, PackedTokenDataset, SyntheticBatchDataset, make_loader
 from model import TinyTransformerLM
+from checkpoint import AsyncCheckpointer, latest_checkpoint, load_checkpoint, set_rng_state, snapshot
+from tokenizer import ByteBPETokenizer
 
 
-def parse_args():
+def parse_args(argv=None):
     p = argparse.ArgumentParser()
     p.add_argument("--batch-size", type=int, default=8)
     p.add_argument("--seq-len", type=int, default=32)
@@ -20,75 +28,377 @@ def parse_args():
     p.add_argument("--save-dir", type=str, default="checkpoints")
     p.add_argument("--log-dir", type=str, default="runs")
     p.add_argument("--checkpoint-interval", type=int, default=1, help="Save checkpoint every N epochs")
-    return p.parse_args()
+    p.add_argument("--resume", type=str, nargs="?", const="auto", default=None, help="Resume from a checkpoint path, or the latest in --save-dir if no path is given")
+    p.add_argument("--keep-last", type=int, default=0, help="Keep only the newest N checkpoints (0 keeps all)")
+    p.add_argument("--data", type=str, default=None, help="Token shard(s) (.bin file, glob or directory); synthetic data if omitted")
+    p.add_argument("--val-data", type=str, default=None, help="Validation shard(s); defaults to the last 10%% of --data")
+    p.add_argument("--token-dtype", type=str, default="uint16", choices=["uint16", "uint32"])
+    p.add_argument("--packed", action="store_true", help="Pack documents from --data (see prepare_reports.py) into full windows")
+    p.add_argument("--eos-id", type=int, default=257, help="Document separator id for --packed")
+    p.add_argument("--tokenizer", type=str, default=None, help="tokenizer.json to embed in checkpoints (default: from --data meta.json)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--num-workers", type=int, default=0)
+    p.add_argument("--pin-memory", action=argparse.BooleanOptionalAction, default=None, help="Default: on when CUDA is used")
+    p.add_argument("--amp", type=str, default="none", choices=["none", "bf16"], help="Autocast dtype (bf16 works on CPU)")
+    p.add_argument("--compile", action="store_true", help="Wrap the model in torch.compile")
+    p.add_argument("--grad-accum", type=int, default=1, help="Micro-batches per optimizer step")
+    p.add_argument("--log-interval", type=int, default=10, help="Log every N optimizer steps")
+    p.add_argument("--benchmark", action="store_true", help="Compare fp32/bf16 and eager/compiled throughput on CPU and exit")
+    p.add_argument("--benchmark-steps", type=int, default=20)
+    p.add_argument("--dist-backend", type=str, default="gloo", help="torch.distributed backend when launched with torchrun")
+    p.add_argument("--threads-per-proc", type=int, default=None, help="Intra-op threads per process (default: cores / local world size)")
+    p.add_argument("--ddp-benchmark", type=str, default=None, metavar="N,N,...", help="Report DDP tokens/sec for these process counts (e.g. 1,2,4,8) and exit")
+    return p.parse_args(argv)
+
+
+def build_datasets(cfg):
+    """Return (train, val) datasets: memory-mapped token shards or synthetic data."""
+    if cfg.data is None:
+        ds = SyntheticBatchDataset(num_samples=256, seq_len=cfg.seq_len, vocab_size=cfg.vocab_size, seed=cfg.seed)
+        val_ds = SyntheticBatchDataset(num_samples=64, seq_len=cfg.seq_len, vocab_size=cfg.vocab_size, seed=cfg.seed + 1)
+        return ds, val_ds
+    if cfg.packed:
+        return build_packed_datasets(cfg)
+    ds = MemmapTokenDataset(cfg.data, seq_len=cfg.seq_len, dtype=cfg.token_dtype)
+    if cfg.val_data is not None:
+        return ds, MemmapTokenDataset(cfg.val_data, seq_len=cfg.seq_len, dtype=cfg.token_dtype)
+    n_val = max(1, len(ds) // 10)
+    return Subset(ds, range(len(ds) - n_val)), Subset(ds, range(len(ds) - n_val, len(ds)))
+
+
+def build_packed_datasets(cfg):
+    """Packed train/val windows over document shards; the last 10% of windows validate."""
+    meta_path = os.path.join(cfg.data, "meta.json")
+    if os.path.isfile(meta_path):
+        # written by prepare_reports.py
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["vocab_size"] > cfg.vocab_size:
+            raise ValueError(f"--vocab-size {cfg.vocab_size} is smaller than the corpus vocabulary ({meta['vocab_size']})")
+        cfg.eos_id, cfg.token_dtype = meta["eos_id"], meta["dtype"]
+        tok_path = os.path.join(cfg.data, meta.get("tokenizer", "tokenizer.json"))
+        if cfg.tokenizer is None and os.path.isfile(tok_path):
+            cfg.tokenizer = tok_path
+    kwargs = {"seq_len": cfg.seq_len, "eos_id": cfg.eos_id, "dtype": cfg.token_dtype, "seed": cfg.seed}
+    if cfg.val_data is not None:
+        ds = PackedTokenDataset(cfg.data, **kwargs)
+        val_ds = PackedTokenDataset(cfg.val_data, shuffle=False, **kwargs)
+    else:
+        n = len(PackedTokenDataset(cfg.data, **kwargs).windows)
+        n_val = max(1, n // 10)
+        ds = PackedTokenDataset(cfg.data, windows=range(n - n_val), **kwargs)
+        val_ds = PackedTokenDataset(cfg.data, shuffle=False, windows=range(n - n_val, n), **kwargs)
+    stats = ds.stats()
+    if os.environ.get("RANK", "0") == "0":
+        print(f"Packed {stats['tokens']} tokens into {stats['windows']} windows of {cfg.seq_len}: "
+              f"efficiency={stats['efficiency']:.2%} padding={stats['padding']}")
+    return ds, val_ds
+
+
+def _unpack(batch, device, non_blocking=False):
+    """Move (x, y[, segment_ids]) to `device`; segment_ids is None for unpacked data."""
+    x, y, *rest = batch
+    seg = rest[0].to(device, non_blocking=non_blocking) if rest else None
+    return x.to(device, non_blocking=non_blocking), y.to(device, non_blocking=non_blocking), seg
+
+
+def autocast_context(device, amp):
+    if amp == "bf16":
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def build_model(cfg, device):
+    """Return (model, raw_model); `model` may be compiled, `raw_model` is for state dicts."""
+    raw_model = TinyTransformerLM(vocab_size=cfg.vocab_size, max_len=cfg.seq_len).to(device)
+    model = torch.compile(raw_model) if cfg.compile else raw_model
+    return model, raw_model
+
+
+def setup_distributed(cfg):
+    """Join the process group described by torchrun's environment variables.
+
+    Returns (rank, world_size, local_rank); (0, 1, 0) when not launched by
+    torchrun. Each process gets an equal share of the CPU cores for intra-op
+    parallelism so N processes do not oversubscribe the machine.
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    if world_size == 1:
+        return 0, 1, 0
+    if not dist.is_initialized():
+        dist.init_process_group(backend=cfg.dist_backend)
+    local_world = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    threads = cfg.threads_per_proc or max(1, (os.cpu_count() or 1) // local_world)
+    torch.set_num_threads(threads)
+    return dist.get_rank(), world_size, int(os.environ.get("LOCAL_RANK", "0"))
 
 
 def train(cfg):
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    ds = SyntheticSeqDataset(num_samples=256, seq_len=cfg.seq_len, vocab_size=cfg.vocab_size)
-    dl = DataLoader(ds, batch_size=cfg.batch_size, shuffle=True)
-    val_ds = SyntheticSeqDataset(num_samples=64, seq_len=cfg.seq_len, vocab_size=cfg.vocab_size)
-    val_dl = DataLoader(val_ds, batch_size=cfg.batch_size, shuffle=False)
-    model = TinyTransformerLM(vocab_size=cfg.vocab_size, max_len=cfg.seq_len).to(device)
+    rank, world_size, local_rank = setup_distributed(cfg)
+    try:
+        _train(cfg, rank, world_size, local_rank)
+    finally:
+        if world_size > 1:
+            dist.destroy_process_group()
+
+
+def _train(cfg, rank, world_size, local_rank):
+    distributed = world_size > 1
+    is_main = rank == 0
+    if torch.cuda.is_available():
+        device = torch.device("cuda", local_rank)
+    else:
+        device = torch.device("cpu")
+    # same seed on every rank so replicas start identical
+    torch.manual_seed(cfg.seed)
+    ds, val_ds = build_datasets(cfg)
+    tokenizer = None
+    if cfg.tokenizer:
+        tok = ByteBPETokenizer.load(cfg.tokenizer)
+        if tok.vocab_size > cfg.vocab_size:
+            raise ValueError(f"--vocab-size {cfg.vocab_size} is smaller than the tokenizer vocabulary ({tok.vocab_size})")
+        tokenizer = tok.state_dict()
+    pin_memory = device.type == "cuda" if cfg.pin_memory is None else cfg.pin_memory
+    loader_kwargs = {"num_workers": cfg.num_workers, "pin_memory": pin_memory}
+    sampler = val_sampler = None
+    # packed (iterable) datasets shard themselves across ranks
+    if distributed and not isinstance(ds, PackedTokenDataset):
+        sampler = DistributedSampler(ds, shuffle=True, seed=cfg.seed)
+        val_sampler = DistributedSampler(val_ds, shuffle=False)
+    dl = make_loader(ds, cfg.batch_size, shuffle=True, sampler=sampler, **loader_kwargs)
+    val_dl = make_loader(val_ds, cfg.batch_size, shuffle=False, sampler=val_sampler, **loader_kwargs)
+    model, raw_model = build_model(cfg, device)
+    if distributed:
+        ddp = DistributedDataParallel(raw_model, device_ids=[local_rank] if device.type == "cuda" else None)
+        model = torch.compile(ddp) if cfg.compile else ddp
     opt = torch.optim.Adam(model.parameters(), lr=cfg.lr)
     loss_fn = torch.nn.CrossEntropyLoss(ignore_index=0)
+    accum = max(1, cfg.grad_accum)
 
-    # logging and checkpoint dirs
-    os.makedirs(cfg.save_dir, exist_ok=True)
-    os.makedirs(cfg.log_dir, exist_ok=True)
-    try:
-        from torch.utils.tensorboard import SummaryWriter
-        writer = SummaryWriter(log_dir=cfg.log_dir)
-    except Exception:
-        writer = None
+    start_epoch = 0
+    step = 0
+    resume_path = latest_checkpoint(cfg.save_dir) if cfg.resume == "auto" else cfg.resume
+    if resume_path:
+        state = load_checkpoint(resume_path)
+        raw_model.load_state_dict(state["model"])
+        opt.load_state_dict(state["opt"])
+        start_epoch = state["epoch"] + 1
+        step = state.get("step", 0)
+        if "rng" in state:
+            set_rng_state(state["rng"])
+        if is_main:
+            print(f"Resumed from {resume_path} at epoch {start_epoch} step {step}")
+
+    # logging and checkpoint dirs (rank 0 only)
+    writer = None
+    checkpointer = None
+    if is_main:
+        os.makedirs(cfg.save_dir, exist_ok=True)
+        os.makedirs(cfg.log_dir, exist_ok=True)
+        checkpointer = AsyncCheckpointer(cfg.save_dir, keep_last=cfg.keep_last)
+        try:
+            from torch.utils.tensorboard import SummaryWriter
+            writer = SummaryWriter(log_dir=cfg.log_dir)
+        except Exception:
+            writer = None
 
-    for epoch in range(cfg.epochs):
+    # running sums stay on device; they are only synced when a log line is written
+    loss_sum = torch.zeros((), device=device)
+    loss_count = 0
+    tokens = 0
+    t_last = time.perf_counter()
+    for epoch in range(start_epoch, cfg.epochs):
+        if sampler is not None:
+            sampler.set_epoch(epoch)
+        elif isinstance(ds, PackedTokenDataset):
+            ds.set_epoch(epoch)
         model.train()
-        for i, (x, y) in enumerate(dl):
-            x = x.to(device)
-            y = y.to(device)
-            logits = model(x)  # (batch, seq_len, vocab)
-            loss = loss_fn(logits.view(-1, logits.size(-1)), y.view(-1))
-            opt.zero_grad()
-            loss.backward()
+        opt.zero_grad(set_to_none=True)
+        for i, batch in enumerate(dl):
+            x, y, seg = _unpack(batch, device, non_blocking=pin_memory)
+            last_batch = i + 1 == len(dl)
+            sync = (i + 1) % accum == 0 or last_batch or cfg.dry_run
+            # skip the gradient all-reduce on accumulation micro-batches
+            no_sync = ddp.no_sync() if distributed and not sync else contextlib.nullcontext()
+            with no_sync:
+                with autocast_context(device, cfg.amp):
+                    logits = model(x, segment_ids=seg)  # (batch, seq_len, vocab)
+                    loss = loss_fn(logits.view(-1, logits.size(-1)).float(), y.view(-1))
+                # average over the micro-batches actually in this group (the
+                # epoch's last group may be short)
+                group_start = i - i % accum
+                (loss / min(accum, len(dl) - group_start)).backward()
+            loss_sum += loss.detach()
+            loss_count += 1
+            tokens += x.numel() * world_size
+            if not sync:
+                continue
             opt.step()
-            print(f"Epoch {epoch} iter {i} loss={loss.item():.4f}")
-            if writer:
-                writer.add_scalar("train/loss", loss.item(), epoch * len(dl) + i)
+            opt.zero_grad(set_to_none=True)
+            step += 1
+            if is_main and (step % cfg.log_interval == 0 or last_batch or cfg.dry_run):
+                if device.type == "cuda":
+                    torch.cuda.synchronize()
+                elapsed = time.perf_counter() - t_last
+                avg_loss = (loss_sum / loss_count).item()
+                tok_s = tokens / max(elapsed, 1e-9)
+                print(f"Epoch {epoch} step {step} loss={avg_loss:.4f} tok/s={tok_s:.0f}")
+                if writer:
+                    writer.add_scalar("train/loss", avg_loss, step)
+                    writer.add_scalar("perf/tokens_per_sec", tok_s, step)
+                    writer.add_scalar("perf/step_time_ms", 1000 * elapsed * accum / loss_count, step)
+                loss_sum.zero_()
+                loss_count = 0
+                tokens = 0
+                t_last = time.perf_counter()
             if cfg.dry_run:
                 if writer:
                     writer.flush()
+                if checkpointer:
+                    checkpointer.close()
                 return
 
         # validation pass
         model.eval()
-        val_loss = 0.0
+        val_loss = torch.zeros((), device=device)
         val_steps = 0
-        with torch.no_grad():
-            for x, y in val_dl:
-                x = x.to(device)
-                y = y.to(device)
-                logits = model(x)
-                loss = loss_fn(logits.view(-1, logits.size(-1)), y.view(-1))
-                val_loss += loss.item()
+        with torch.no_grad(), autocast_context(device, cfg.amp):
+            for batch in val_dl:
+                x, y, seg = _unpack(batch, device)
+                logits = model(x, segment_ids=seg)
+                val_loss += loss_fn(logits.view(-1, logits.size(-1)).float(), y.view(-1))
                 val_steps += 1
-        val_loss = val_loss / max(1, val_steps)
-        print(f"Epoch {epoch} validation loss={val_loss:.4f}")
+        totals = torch.stack([val_loss.float(), torch.tensor(float(val_steps), device=device)])
+        if distributed:
+            dist.all_reduce(totals)
+        val_loss = totals[0].item() / max(1.0, totals[1].item())
+        if is_main:
+            print(f"Epoch {epoch} validation loss={val_loss:.4f}")
         if writer:
             writer.add_scalar("val/loss", val_loss, epoch)
 
         # checkpoint
-        if (epoch + 1) % cfg.checkpoint_interval == 0:
+        if is_main and (epoch + 1) % cfg.checkpoint_interval == 0:
             ckpt_path = f"{cfg.save_dir}/ckpt_epoch_{epoch+1}.pt"
-            torch.save({"model": model.state_dict(), "opt": opt.state_dict(), "epoch": epoch}, ckpt_path)
-            print(f"Saved checkpoint: {ckpt_path}")
+            # snapshot to CPU here; serialization runs on the checkpointer thread
+            checkpointer.save(snapshot(raw_model, opt, epoch, step, tokenizer), ckpt_path)
+            print(f"Saving checkpoint: {ckpt_path}")
             if writer:
                 writer.add_text("checkpoint", ckpt_path, epoch)
 
+    if checkpointer:
+        checkpointer.close()
     if writer:
         writer.flush()
 
 
+def benchmark(cfg):
+    """Time optimizer steps on CPU for each precision / compilation mode."""
+    device = torch.device("cpu")
+    ds = SyntheticBatchDataset(num_samples=cfg.batch_size * 8, seq_len=cfg.seq_len, vocab_size=cfg.vocab_size, seed=cfg.seed)
+    batches = [ds[list(range(j, j + cfg.batch_size))] for j in range(0, len(ds), cfg.batch_size)]
+    loss_fn = torch.nn.CrossEntropyLoss(ignore_index=0)
+    results = []
+    for compiled in (False, True):
+        for amp in ("none", "bf16"):
+            torch.manual_seed(cfg.seed)
+            mode_cfg = argparse.Namespace(**{**vars(cfg), "amp": amp, "compile": compiled})
+            model, _ = build_model(mode_cfg, device)
+            opt = torch.optim.Adam(model.parameters(), lr=cfg.lr)
+            name = f"{'bf16' if amp == 'bf16' else 'fp32'}/{'compiled' if compiled else 'eager'}"
+
+            def step(x, y):
+                with autocast_context(device, amp):
+                    logits = model(x)
+                    loss = loss_fn(logits.view(-1, logits.size(-1)).float(), y.view(-1))
+                loss.backward()
+                opt.step()
+                opt.zero_grad(set_to_none=True)
+                return loss.detach()
+
+            try:
+                for x, y in batches[:2]:  # warm-up (and compilation)
+                    step(x, y)
+                t0 = time.perf_counter()
+                for k in range(cfg.benchmark_steps):
+                    last = step(*batches[k % len(batches)])
+                last.item()
+                elapsed = time.perf_counter() - t0
+            except Exception as e:
+                print(f"{name:16s} unavailable: {type(e).__name__}: {e}")
+                continue
+            tok_s = cfg.benchmark_steps * cfg.batch_size * cfg.seq_len / elapsed
+            results.append((name, 1000 * elapsed / cfg.benchmark_steps, tok_s))
+            print(f"{name:16s} step={results[-1][1]:8.2f} ms  tok/s={tok_s:10.0f}")
+    return results
+
+
+def _ddp_benchmark_worker(rank, world_size, port, cfg, results):
+    os.environ.update({
+        "MASTER_ADDR": "127.0.0.1", "MASTER_PORT": str(port),
+        "RANK": str(rank), "WORLD_SIZE": str(world_size),
+        "LOCAL_RANK": str(rank), "LOCAL_WORLD_SIZE": str(world_size),
+    })
+    dist.init_process_group(backend="gloo", rank=rank, world_size=world_size)
+    try:
+        torch.set_num_threads(cfg.threads_per_proc or max(1, (os.cpu_count() or 1) // world_size))
+        torch.manual_seed(cfg.seed)
+        model = DistributedDataParallel(TinyTransformerLM(vocab_size=cfg.vocab_size, max_len=cfg.seq_len))
+        opt = torch.optim.Adam(model.parameters(), lr=cfg.lr)
+        loss_fn = torch.nn.CrossEntropyLoss(ignore_index=0)
+        ds = SyntheticBatchDataset(num_samples=cfg.batch_size * 4, seq_len=cfg.seq_len, vocab_size=cfg.vocab_size, seed=cfg.seed + rank)
+        x, y = ds[list(range(cfg.batch_size))]
+
+        def step():
+            logits = model(x)
+            loss = loss_fn(logits.view(-1, logits.size(-1)), y.view(-1))
+            loss.backward()
+            opt.step()
+            opt.zero_grad(set_to_none=True)
+
+        for _ in range(2):
+            step()
+        dist.barrier()
+        t0 = time.perf_counter()
+        for _ in range(cfg.benchmark_steps):
+            step()
+        dist.barrier()
+        if rank == 0:
+            results.put(time.perf_counter() - t0)
+    finally:
+        dist.destroy_process_group()
+
+
+def ddp_benchmark(cfg):
+    """Report global tokens/sec of DDP training for each requested process count.
+
+    Every process trains on its own `batch_size` sequences, so the global batch
+    grows with the process count (weak scaling).
+    """
+    import socket
+    import torch.multiprocessing as mp
+
+    ctx = mp.get_context("spawn")
+    rows = []
+    for n in [int(v) for v in cfg.ddp_benchmark.split(",")]:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        results = ctx.SimpleQueue()
+        mp.start_processes(_ddp_benchmark_worker, args=(n, port, cfg, results), nprocs=n, start_method="spawn")
+        elapsed = results.get()
+        tok_s = cfg.benchmark_steps * cfg.batch_size * cfg.seq_len * n / elapsed
+        rows.append((n, tok_s))
+        speedup = tok_s / rows[0][1]
+        print(f"procs={n:2d}  tok/s={tok_s:10.0f}  step={1000 * elapsed / cfg.benchmark_steps:8.2f} ms  speedup={speedup:5.2f}x")
+    return rows
+
+
 if __name__ == "__main__":
     cfg = parse_args()
-    train(cfg)
+    if cfg.benchmark:
+        benchmark(cfg)
+    elif cfg.ddp_benchmark:
+        ddp_benchmark(cfg)
+    else:
+        train(cfg)